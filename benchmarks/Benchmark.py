@@ -0,0 +1,105 @@
+import argparse
+import json
+import tempfile
+
+from consensus.ConsensusFileGenerator import ConsensusFileGenerator
+from consensus.ConsensusReporter import ConsensusReporter
+from consensus.ConsensusTableGenerator import ConsensusTableGenerator
+from consensus.DataRetriever import DataRetriever
+from consensus.HistorySorter import HistorySorter
+from consensus.MolgenisConfigParser import MolgenisConfigParser as ConfigParser
+from consensus.PipelineMetrics import PipelineMetrics
+from preprocessing.PreProcessor import PreProcessor
+
+from benchmarks.SyntheticDataGenerator import SyntheticDataGenerator
+
+
+class Benchmark:
+    """The Benchmark runs the stages of the pipeline on generated data and records the PipelineMetrics of each stage"""
+
+    def __init__(self, config_file):
+        """
+        :param config_file: the config file of the generated data (see SyntheticDataGenerator)
+        """
+        self.config = ConfigParser(config_file)
+        self.previous_exports = self.config.previous if type(self.config.previous) == list else [self.config.previous]
+        self.metrics = PipelineMetrics()
+
+    def run(self):
+        """
+        Runs the stages of the pipeline in the order of consensus.__main__
+        :return: dictionary with the metrics of each stage and of each lab
+        """
+        config = self.config
+        output = config.output
+        metrics = self.metrics
+        with metrics.stage('preprocessing'):
+            lab_files = [config.prefix + lab + '.tsv' for lab in config.labs]
+            PreProcessor(lab_files, config.labs, 'vkgl_comments.tsv', config.input, output)
+        with metrics.stage('retrieval') as stage:
+            retriever = DataRetriever(config.labs, config.prefix, f'{config.input}{config.prefix}{config.history}.tsv',
+                                      output, lab_columns=ConsensusTableGenerator.lab_columns,
+                                      history_columns=HistorySorter.history_columns, metrics=metrics)
+            retriever.retrieve_all_data()
+            stage['rows'] = sum(len(lab_data) for lab_data in retriever.all_lab_data.values()) + len(retriever.history)
+        with metrics.stage('history') as stage:
+            history_sorter = HistorySorter(retriever.history, self.previous_exports)
+            stage['rows'] = len(history_sorter.history_index)
+        with metrics.stage('consensus') as stage:
+            consensus = ConsensusTableGenerator(retriever.all_lab_data).process_variants()
+            stage['rows'] = len(consensus)
+        with metrics.stage('files') as stage:
+            ConsensusFileGenerator(
+                data={'consensus': consensus,
+                      'history': {'history': history_sorter.history_index,
+                                  'alternative': history_sorter.alternative_history,
+                                  'exports': self.previous_exports}},
+                tables={'consensus_table': output + config.prefix + config.consensus,
+                        'comments_table': output + config.prefix + config.comments},
+                labs=config.labs,
+                incorrect_variant_history_file=output + 'incorrect_variant_history.tsv').generate_consensus_files()
+            stage['rows'] = len(consensus)
+        with metrics.stage('reports') as stage:
+            ConsensusReporter.from_consensus(consensus, config.labs, config.prefix + 'public_consensus', config.prefix,
+                                             output).process_consensus()
+            stage['rows'] = len(consensus)
+        return metrics.to_dict()
+
+    def print_results(self):
+        print(f'\n{"stage":<15}{"seconds":>10}{"rows/sec":>12}{"process peak RSS (MB)":>24}')
+        for stage in self.metrics.stages:
+            print(f'{stage["stage"]:<15}{stage["seconds"]:>10}{str(stage["rows_per_second"] or "-"):>12}'
+                  f'{str(stage["process_peak_rss_mb"] or "-"):>24}')
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Benchmark the consensus pipeline with generated data')
+    parser.add_argument('--labs', type=int, default=8)
+    parser.add_argument('--variants', type=int, default=100000)
+    parser.add_argument('--overlap', type=float, default=0.3)
+    parser.add_argument('--conflict-rate', type=float, default=0.02)
+    parser.add_argument('--indel-fraction', type=float, default=0.1)
+    parser.add_argument('--exports', type=int, default=9)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--folder', help='folder to generate the data in (default: a temporary folder)')
+    parser.add_argument('--json', help='file to write the measurements to')
+    args = parser.parse_args(arguments)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        folder = args.folder if args.folder else tmp_dir
+        folder = folder if folder.endswith('/') else folder + '/'
+        generator = SyntheticDataGenerator(labs=args.labs, variants=args.variants, overlap=args.overlap,
+                                           conflict_rate=args.conflict_rate, indel_fraction=args.indel_fraction,
+                                           exports=args.exports, seed=args.seed)
+        print(f'Generating {args.variants} variants for {args.labs} labs in [{folder}]')
+        benchmark = Benchmark(generator.generate(folder))
+        results = benchmark.run()
+        benchmark.print_results()
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump({'parameters': vars(args), **results}, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
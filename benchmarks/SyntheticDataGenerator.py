@@ -0,0 +1,185 @@
+import os
+import random
+
+from consensus.Hasher import Hasher
+from consensus.TsvWriter import TsvWriter
+
+
+class SyntheticDataGenerator:
+    """
+    The SyntheticDataGenerator writes raw lab files, a history file and a config file with the layout of a VKGL export,
+    so the pipeline can be benchmarked with any number of labs and variants
+    """
+
+    raw_columns = ['id', 'chromosome', 'start', 'stop', 'ref', 'alt', 'gene', 'c_dna', 'hgvs_g', 'hgvs_c', 'transcript',
+                   'protein', 'type', 'location', 'exon', 'effect', 'classification', 'comments', 'is_legacy',
+                   'lab_upload_date']
+    chromosomes = [str(chromosome) for chromosome in range(1, 23)] + ['X']
+    classifications = ['b', 'lb', 'vus', 'lp', 'p']
+    # How often each classification is used, most variants are (likely) benign
+    classification_weights = [35, 30, 25, 5, 5]
+    opposites = {'b': 'p', 'lb': 'lp', 'vus': 'lb', 'lp': 'lb', 'p': 'b'}
+    full_classifications = {'b': 'Benign', 'lb': 'Likely benign', 'vus': 'VUS', 'lp': 'Likely pathogenic',
+                            'p': 'Pathogenic'}
+    bases = 'ACGT'
+
+    def __init__(self, labs=8, variants=100000, overlap=0.3, conflict_rate=0.02, indel_fraction=0.1, exports=9,
+                 genes=2000, seed=1):
+        """
+        :param labs: the number of labs
+        :param variants: the number of distinct variants in the lab files
+        :param overlap: the fraction of the variants that is classified by more than one lab
+        :param conflict_rate: the chance that a lab classifies a variant that is also classified by another lab
+        differently
+        :param indel_fraction: the fraction of the variants that is a deletion, insertion, duplication or delins
+        :param exports: the number of previous exports in the history
+        :param genes: the number of distinct genes
+        :param seed: the seed of the random generator, the same seed generates the same files
+        """
+        self.labs = [f'lab{number}' for number in range(1, labs + 1)]
+        self.number_of_variants = variants
+        self.overlap = overlap
+        self.conflict_rate = conflict_rate
+        self.indel_fraction = indel_fraction
+        self.exports = self._get_exports(exports)
+        self.genes = [f'GENE{number}' for number in range(1, genes + 1)]
+        self.random = random.Random(seed)
+
+    @staticmethod
+    def _get_exports(number_of_exports):
+        """
+        Creates the ids of exports with three months between them, ending in december 2020
+        :param number_of_exports: the number of exports
+        :return: list of export ids (yymm)
+        """
+        exports = []
+        year, month = 20, 12
+        for _ in range(number_of_exports):
+            exports.insert(0, f'{year:02d}{month:02d}')
+            month -= 3
+            if month < 1:
+                year, month = year - 1, month + 12
+        return exports
+
+    def _get_sequence(self, length):
+        return ''.join(self.random.choice(self.bases) for _ in range(length))
+
+    def _create_ref_alt(self):
+        """
+        Creates a ref and alt the way the labs specify them: indels include the base before the variant
+        :return: tuple with ref, alt and the type of the variant
+        """
+        if self.random.random() >= self.indel_fraction:
+            ref = self.random.choice(self.bases)
+            alt = self.random.choice(self.bases.replace(ref, ''))
+            return ref, alt, 'sub'
+        variant_type = self.random.choice(['del', 'ins', 'dup', 'delins'])
+        anchor = self._get_sequence(1)
+        sequence = self._get_sequence(self.random.randint(1, 20))
+        if variant_type == 'del':
+            return anchor + sequence, anchor, variant_type
+        elif variant_type == 'delins':
+            ref = self._get_sequence(self.random.randint(2, 10))
+            alt = self.random.choice(self.bases.replace(ref[0], '')) + self._get_sequence(self.random.randint(1, 10))
+            return ref, alt, variant_type
+        return anchor, anchor + sequence, variant_type
+
+    def _create_variant(self):
+        """
+        Creates a random variant
+        :return: dictionary with the columns of the variant that are the same for all labs
+        """
+        chromosome = self.random.choice(self.chromosomes)
+        start = self.random.randint(10000, 200000000)
+        ref, alt, variant_type = self._create_ref_alt()
+        gene = self.random.choice(self.genes)
+        stop = start + len(ref) - 1
+        c_position = self.random.randint(1, 10000)
+        return {'chromosome': chromosome, 'start': str(start), 'stop': str(stop), 'ref': ref, 'alt': alt, 'gene': gene,
+                'c_dna': f'c.{c_position}{ref}>{alt}', 'hgvs_g': f'NC_0000{chromosome}.10:g.{start}{ref}>{alt}',
+                'hgvs_c': '', 'transcript': f'NM_{self.genes.index(gene):06d}.1', 'protein': '', 'type': variant_type,
+                'location': 'exonic', 'exon': str(self.random.randint(1, 30)), 'effect': 'nonsynonymous',
+                'comments': '', 'is_legacy': '', 'lab_upload_date': '2020-12-01 10:00:00',
+                'id': Hasher.hash(f'{chromosome}_{start}_{ref}_{alt}_{gene}')}
+
+    def _classify(self, variant_labs):
+        """
+        Classifies a variant by each of its labs, the labs agree unless a conflict is generated
+        :param variant_labs: the labs that classify the variant
+        :return: dictionary with the classification of each lab
+        """
+        classification = self.random.choices(self.classifications, self.classification_weights)[0]
+        classifications = {}
+        for lab in variant_labs:
+            conflicting = len(classifications) > 0 and self.random.random() < self.conflict_rate
+            classifications[lab] = self.opposites[classification] if conflicting else classification
+        return classifications
+
+    def _get_variant_labs(self):
+        if self.random.random() >= self.overlap or len(self.labs) == 1:
+            return [self.random.choice(self.labs)]
+        return self.random.sample(self.labs, self.random.randint(2, min(4, len(self.labs))))
+
+    def _write_history(self, history_file, variants):
+        """
+        Writes a history in which each export contains more of the variants than the previous export
+        :param history_file: the path of the history file
+        :param variants: the variants with their lab classifications
+        :return: None
+        """
+        with TsvWriter(history_file) as history:
+            history.write_row(['id', 'export', 'chromosome', 'start', 'stop', 'ref', 'alt', 'gene', 'c_dna',
+                               'transcript', 'protein'] + self.labs + ['consensus_classification', 'matches',
+                                                                       'comments'])
+            for number, export in enumerate(self.exports, start=1):
+                exported = variants[:len(variants) * number // (len(self.exports) + 1)]
+                for variant, classifications in exported:
+                    # Before the october 2019 export the ids were not hashed
+                    if export < '1910':
+                        row_id = '{}_{}_{}_{}_{}'.format(variant['chromosome'], variant['start'], variant['ref'],
+                                                         variant['alt'], variant['gene'])
+                    else:
+                        row_id = variant['id'][0:10]
+                    lab_classifications = [self.full_classifications[classifications[lab]] if lab in
+                                           classifications else '' for lab in self.labs]
+                    history.write_row([f'{export}_{row_id}', export] +
+                                      [variant[column] for column in ['chromosome', 'start', 'stop', 'ref', 'alt',
+                                                                      'gene', 'c_dna', 'transcript', 'protein']] +
+                                      lab_classifications + ['', str(len(classifications)), '-'])
+
+    def _write_config(self, config_file, input_folder, output_folder):
+        with open(config_file, 'w') as config:
+            config.write(f'labs={",".join(self.labs)}\n')
+            config.write('prefix=vkgl_\nconsensus=consensus\ncomments=consensus_comments\n')
+            config.write(f'previous={",".join(self.exports)}\nhistory=consensus_history\n')
+            config.write(f'input={input_folder}\noutput={output_folder}\n')
+
+    def generate(self, folder):
+        """
+        Writes the raw lab files and the history to the input folder and a config file to the folder
+        :param folder: the folder to generate the data in (with a slash at the end)
+        :return: the path of the config file
+        """
+        input_folder = f'{folder}input/'
+        output_folder = f'{folder}output/'
+        os.makedirs(input_folder, exist_ok=True)
+        os.makedirs(output_folder, exist_ok=True)
+
+        variants = []
+        lab_files = {lab: TsvWriter(f'{input_folder}vkgl_{lab}.tsv') for lab in self.labs}
+        for lab_file in lab_files.values():
+            lab_file.write_row(self.raw_columns)
+        for _ in range(self.number_of_variants):
+            variant = self._create_variant()
+            classifications = self._classify(self._get_variant_labs())
+            for lab, classification in classifications.items():
+                lab_files[lab].write_row([classification if column == 'classification' else variant[column] for
+                                          column in self.raw_columns])
+            variants.append((variant, classifications))
+        for lab_file in lab_files.values():
+            lab_file.close()
+
+        self._write_history(f'{input_folder}vkgl_consensus_history.tsv', variants)
+        config_file = f'{folder}config.txt'
+        self._write_config(config_file, input_folder, output_folder)
+        return config_file
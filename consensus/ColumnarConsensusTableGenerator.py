@@ -0,0 +1,192 @@
+from operator import itemgetter
+
+import numpy
+import pandas
+
+from consensus.ConsensusTableGenerator import ConsensusTableGenerator
+
+
+class ColumnarConsensusTableGenerator:
+    """
+    The ColumnarConsensusTableGenerator generates the same consensus as the ConsensusTableGenerator, but instead of
+    updating each variant for each lab variant, it loads all lab variants in a single table and determines the consensus
+    of all variants at once with vectorized operations
+    """
+
+    lab_columns = ConsensusTableGenerator.lab_columns
+    # Classifications as small integers, the position in this list is the code of the classification
+    classifications = ['vus', 'b', 'lb', 'p', 'lp']
+    # Columns that are taken from the first lab variant that specifies them
+    optional_columns = ['c_dna', 'protein', 'stop', 'transcript']
+
+    def __init__(self, lab_data):
+        """
+        :param lab_data: lab data as generated by DataRetriever ({lab1: [{variant1}, {variant2}, ...], lab2: [...]}),
+        all variants of a lab should have the same columns (like the rows of a file)
+        """
+        self.lab_data = lab_data
+        self.labs = [lab for lab in lab_data]
+        self.consensus = {}
+        self.all_classifications = {}
+        self.no_consensus = 'No consensus'
+        self.opposite_consensus = 'Opposite classifications'
+        self.one_lab = 'Classified by one lab'
+
+    def _create_lab_table(self, lab_index, lab, variants):
+        """
+        Creates a table with the variants of a single lab
+        :param lab_index: the position of the lab in the labs
+        :param lab: the id of the lab
+        :param variants: the variants as specified by the lab (dictionaries or TsvRecords)
+        :return: a DataFrame with the columns of the lab, the hgvs, the consensus id and the lab index of each variant
+        """
+        variants = list(variants)
+        if len(variants) == 0:
+            return None
+        columns = [column for column in self.lab_columns if column in variants[0]]
+        table = pandas.DataFrame.from_records(list(map(itemgetter(*columns), variants)), columns=columns)
+
+        lab_id = lab.replace('_', '').upper() + '_'
+        table['variant_id'] = table['id'].str.replace(lab_id, '', regex=False)
+        table['lab'] = lab_index
+        if 'hgvs_g' in table:
+            table['hgvs'] = table['hgvs_g']
+        elif 'hgvs_c' in table:
+            table['hgvs'] = table['hgvs_c']
+        else:
+            table['hgvs'] = ''
+        if 'stop' in table:
+            # A stop of "0" is treated as unspecified
+            table['stop'] = table['stop'].where(table['stop'] != '0')
+        return table.drop(columns=[column for column in ['hgvs_g', 'hgvs_c'] if column in table])
+
+    def _create_table(self):
+        """
+        Loads the variants of all labs in a single table, in the order the labs and their variants are specified
+        :return: a DataFrame with the variants of all labs
+        """
+        tables = [self._create_lab_table(lab_index, lab, self.lab_data[lab]) for lab_index, lab in
+                  enumerate(self.labs)]
+        tables = [table for table in tables if table is not None]
+        if len(tables) == 0:
+            return None
+        return pandas.concat(tables, ignore_index=True)
+
+    def _count_classifications(self, variant_codes, number_of_variants, lab_classifications):
+        """
+        Counts how many times each classification was given to each variant
+        :param variant_codes: for each lab variant the position of its variant in the consensus
+        :param number_of_variants: the number of variants in the consensus
+        :param lab_classifications: for each lab variant its classification (b/lb/vus/lp/p)
+        :return: an array with a row per variant and a column per classification (in the order of classifications)
+        """
+        classification_codes = lab_classifications.map({classification: code for code, classification in
+                                                        enumerate(self.classifications)})
+        if classification_codes.isna().any():
+            raise KeyError(lab_classifications[classification_codes.isna()].iloc[0])
+        counts = numpy.zeros((number_of_variants, len(self.classifications)), dtype=numpy.int64)
+        numpy.add.at(counts, (variant_codes, classification_codes.to_numpy(dtype=numpy.int64)), 1)
+        return counts
+
+    def _get_consensus_classifications(self, counts):
+        """
+        Determines the consensus classification of all variants, see Classifications.is_conflicting_classification and
+        Classifications.is_no_consensus
+        :param counts: the classification counts as created by _count_classifications
+        :return: an array with the consensus classification of each variant
+        """
+        vus, b, lb, p, lp = [counts[:, code] > 0 for code in range(len(self.classifications))]
+        benign = b | lb
+        pathogenic = p | lp
+        conditions = [counts.sum(axis=1) == 1, benign & pathogenic, vus & (benign | pathogenic), benign, pathogenic]
+        choices = [self.one_lab, self.opposite_consensus, self.no_consensus, '(Likely) benign', '(Likely) pathogenic']
+        return numpy.select(conditions, choices, default='VUS')
+
+    def _add_variants(self, table, variant_ids, first_index, consensus_classifications):
+        """
+        Adds the variants to the consensus with the columns of the first lab variant that classified them
+        :param table: the table with the variants of all labs
+        :param variant_ids: the ids of the variants in the consensus
+        :param first_index: for each variant the position of its first lab variant in the table
+        :param consensus_classifications: for each variant its consensus classification
+        :return: None
+        """
+        first = table.iloc[first_index]
+        columns = [first[column].tolist() for column in ['chromosome', 'start', 'ref', 'alt', 'gene', 'type', 'hgvs',
+                                                         'id', 'lab']]
+        for variant_id, chromosome, start, ref, alt, gene, variant_type, hgvs, lab_variant_id, lab_index, \
+                consensus_classification in zip(variant_ids, *columns, consensus_classifications.tolist()):
+            self.consensus[variant_id] = {
+                'lab_classifications': {lab: '' for lab in self.labs},
+                'consensus': {
+                    'chromosome': chromosome,
+                    'start': start,
+                    'ref': ref,
+                    'alt': alt,
+                    'gene': gene,
+                    'type': variant_type,
+                    'hgvs': hgvs,
+                    self.labs[lab_index] + '_link': lab_variant_id,
+                    'id': variant_id,
+                    'consensus_classification': consensus_classification
+                }
+            }
+
+    def _add_optional_columns(self, table, variant_codes, variant_ids):
+        """
+        Adds the optional columns to the variants, the value of the first lab variant that specifies the column is used
+        :param table: the table with the variants of all labs
+        :param variant_codes: for each lab variant the position of its variant in the consensus
+        :param variant_ids: the ids of the variants in the consensus
+        :return: None
+        """
+        columns = [column for column in self.optional_columns if column in table]
+        if len(columns) == 0:
+            return
+        # first() skips missing values: labs without the column and stops that are "0"
+        first_values = table[columns].groupby(variant_codes).first()
+        for column in columns:
+            for code, value in zip(first_values.index.tolist(), first_values[column].tolist()):
+                if not pandas.isna(value):
+                    self.consensus[variant_ids[code]]['consensus'][column] = value
+
+    def _add_lab_classifications(self, table):
+        """
+        Adds the classification and the link of each lab to the variants, if a lab classified a variant more than once
+        the last classification is used
+        :param table: the table with the variants of all labs
+        :return: None
+        """
+        last = table.drop_duplicates(['variant_id', 'lab'], keep='last')
+        for variant_id, lab_index, lab_variant_id, classification in zip(
+                last['variant_id'].tolist(), last['lab'].tolist(), last['id'].tolist(),
+                last['classification'].tolist()):
+            lab = self.labs[lab_index]
+            variant = self.consensus[variant_id]
+            variant['consensus'][lab + '_link'] = lab_variant_id
+            variant['lab_classifications'][lab] = classification
+
+    def process_variants(self):
+        """
+        Loads the variants of all labs in one table and determines the consensus of all variants at once
+        :return: consensus ({chr_pos_ref_alt:{variant info}}), the same as ConsensusTableGenerator.process_variants
+        """
+        print('\nProcessing variants')
+        table = self._create_table()
+        if table is None:
+            return self.consensus
+
+        # Codes are assigned in order of appearance, so the consensus has the same order as when processed per variant
+        variant_codes, variant_ids = pandas.factorize(table['variant_id'])
+        variant_ids = variant_ids.tolist()
+        first_index = numpy.unique(variant_codes, return_index=True)[1]
+
+        counts = self._count_classifications(variant_codes, len(variant_ids), table['classification'])
+        consensus_classifications = self._get_consensus_classifications(counts)
+
+        self._add_variants(table, variant_ids, first_index, consensus_classifications)
+        self._add_optional_columns(table, variant_codes, variant_ids)
+        self._add_lab_classifications(table)
+        self.all_classifications = {variant_id: dict(zip(self.classifications, variant_counts)) for
+                                    variant_id, variant_counts in zip(variant_ids, counts.tolist())}
+        return self.consensus
@@ -1,21 +1,43 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
 import progressbar
 from termcolor import colored
 from consensus.Classifications import Classifications
-from consensus.Hasher import Hasher
+from consensus.HashCache import HashCache
+from consensus.HistorySorter import HistorySorter
+from consensus.TsvWriter import TsvWriter
 
 
 class ConsensusFileGenerator:
     """The ConsensusFileGenerator creates tsv files for the consensus data"""
 
-    def __init__(self, data, tables, labs, incorrect_variant_history_file=None):
+    # The number of shards per worker process, more shards than workers keep the workers busy until the end
+    shards_per_worker = 4
+    # The ConsensusFileGenerator in a worker process (see _initialize_worker)
+    _worker_generator = None
+
+    def __init__(self, data, tables, labs, incorrect_variant_history_file=None, hash_cache=None, buffer_size=1000,
+                 workers=None):
         """
         :param data: a dictionary with:
             - data: variant information as created by process_variants in ConsensusTableGenerator
             - lab_classifications: all lab classifications as all_lab_classifications in ConsensusTableGenerator
-            - history: the history data
+            - history: the history data as created by HistorySorter:
+                - history: the history index ({row_id: {export: {suffix}}})
+                - alternative: the alternative history of each export ({export: {gene_transcript:c_dna: id}})
+                - exports: the ids of the previous exports in the order they should appear in the history column
         :param tables: a dictionary with:
             - consensus_table: outputDir + the fully qualified name of the consensus table
             - comments_table:  outputDir + the fully qualified name of the consensus comments table
+        :param labs: a list with all labs
+        :param incorrect_variant_history_file: the file to log variants with incorrect history to
+        :param hash_cache: the HashCache to hash variant ids with (default: a HashCache that is only kept in memory)
+        :param buffer_size: the number of rows to collect before they are written to the output files
+        :param workers: the number of worker processes to generate shards of the files with (None to generate the files
+        in this process)
         """
         consensus_table = tables['consensus_table']
         comments_table = tables['comments_table']
@@ -23,13 +45,34 @@ class ConsensusFileGenerator:
         self.labs = labs
         self.history = data['history']['history']
         self.alternative_history = data['history']['alternative']
+        self.exports = data['history']['exports']
         self.consensus_table_file_name = consensus_table
         self.comments_table_file_name = comments_table
         self.incorrect_variant_history_file_name = incorrect_variant_history_file
+        # Opened once for all variants by generate_consensus_files
+        self.incorrect_history_file = None
+        self.hash_cache = hash_cache if hash_cache is not None else HashCache()
+        self.buffer_size = buffer_size
+        self.workers = workers
         if self.incorrect_variant_history_file_name:
             incorrect_history_file = open(self.incorrect_variant_history_file_name, 'w')
             incorrect_history_file.close()
 
+    @staticmethod
+    def _get_consensus_header_fields(labs):
+        """
+        Return the columns of the consensus csv file
+        :param labs: a list with all labs
+        :return: list with the names of the columns
+        """
+        fields = ['id', 'chromosome', 'start', 'stop', 'ref', 'alt', 'gene', 'c_dna', 'transcript', 'protein', 'hgvs',
+                  'consensus_classification']
+        for lab in labs:
+            fields += [f'{lab}_link', lab]
+
+        fields += ['matches', 'history', 'disease', 'comments']
+        return fields
+
     @staticmethod
     def create_consensus_header(labs):
         """
@@ -37,51 +80,46 @@ class ConsensusFileGenerator:
         :param labs: a list with all labs
         :return: the line with the header
         """
-        line = 'id\tchromosome\tstart\tstop\tref\talt\tgene\tc_dna\ttranscript\tprotein\thgvs\tconsensus_classification'
-        for lab in labs:
-            line += f'\t{lab}_link\t{lab}'
-
-        line += '\tmatches\thistory\tdisease\tcomments\n'
-        return line
+        return '\t'.join(ConsensusFileGenerator._get_consensus_header_fields(labs)) + '\n'
 
     @staticmethod
-    def _add_simple_column(line, variant, column):
+    def _get_simple_column(variant, column):
         """
-        Add value as column in csv format
-        :param line: the line to add the value to
+        Get the value of a column that doesn't need a transformation
         :param variant: the variant in which the column is specified
         :param column: the name of the column
-        :return: the line after the column is added
+        :return: the value of the column, or an empty value if the column is not specified
         """
-        value = variant[column] if column in variant else ''
-        line += f'\t{value}'
-        return line
+        return variant[column] if column in variant else ''
+
+    def _get_hashed_variant(self, variant):
+        """
+        Returns the hashed id of the variant, which is the same for all labs
+        :param variant: variant to get info from to generate the hashed id of
+        :return: the first 10 characters of the hash of chr_pos_ref_alt_gene
+        """
+        return self.hash_cache.hash(
+            self._get_variant(variant['chromosome'], variant['start'], variant['ref'], variant['alt'], variant['gene']))
 
     @staticmethod
-    def _get_lab_classification(variant_classifications, lab, variant):
+    def _get_lab_classification(variant_classifications, lab, hashed_variant):
         """
         Returns the lab classification and the id of the variant in the lab table if the lab classified the variant
         :param variant_classifications: all classifications provided for the variant ({lab: (b|lb|v|lp|p)})
         :param lab: id of the lab
-        :param variant: variant to get info from to generate the lab id of
-        :return: if classification is specified: the lab id and classification (\tlab_chr_pos_ref_alt_gene\tBenign)
-        else two empty columns (\t\t)
+        :param hashed_variant: the hashed id of the variant (see _get_hashed_variant) to generate the lab id with
+        :return: if classification is specified: the lab id and classification ([LAB_hash, Benign]) else two empty
+        columns (['', ''])
         """
-        chromosome = str(variant['chromosome'])
-        start = str(variant['start'])
-        ref = variant['ref']
-        alt = variant['alt']
-        gene = variant['gene']
         empty = ''
 
         if variant_classifications[lab] == empty:
-            return '\t\t', False
+            return [empty, empty], False
         else:
             classification = Classifications.get_full_classification_from_abbreviation(variant_classifications[lab])
             lab_id = lab.upper().replace('_', '')
-            variant_id = Hasher.hash(f'{chromosome}_{start}_{ref}_{alt}_{gene}')[0:10]
-            variant_lab_id = lab_id + '_' + variant_id
-            return f'\t{variant_lab_id}\t{classification}', True
+            variant_lab_id = lab_id + '_' + hashed_variant
+            return [variant_lab_id, classification], True
 
     @staticmethod
     def _get_match_count_if_consensus(matches, classification):
@@ -93,15 +131,9 @@ class ConsensusFileGenerator:
         """
         # Consensus can be (Likely) benign/(Likely) pathogenic/VUS and one lab always agrees with itself
         if '(Likely)' in classification or classification == 'VUS' or classification == 'Classified by one lab':
-            return f'\t{str(matches)}'
+            return str(matches)
         else:
-            return '\t'
-
-    @staticmethod
-    def _add_history_of_variant(id_to_match, export, variant_history):
-        if id_to_match in export:
-            variant_history.append(id_to_match)
-        return variant_history
+            return ''
 
     def _get_history_ids_for_variant(self, variant_id, chromosome, position, ref, alt, gene, variant_type):
         ids = [variant_id]
@@ -138,8 +170,7 @@ class ConsensusFileGenerator:
         return f'{chromosome}_{pos}_{ref}_{alt}_{gene}'
 
     def _get_hashed_old_variant(self, anchor, chromosome, pos, ref, alt, gene):
-        return Hasher.hash(
-            self._get_variant(chromosome, pos, f'{anchor}{ref}', f'{anchor}{alt}', gene))[0:10]
+        return self.hash_cache.hash(self._get_variant(chromosome, pos, f'{anchor}{ref}', f'{anchor}{alt}', gene))
 
     def _get_matching_history(self, variant):
         """
@@ -155,19 +186,17 @@ class ConsensusFileGenerator:
         chromosome = variant['chromosome']
         gene = variant['gene']
         variant_type = variant['type']
-        incorrect_history_file = None
-        if self.incorrect_variant_history_file_name:
-            incorrect_history_file = open(self.incorrect_variant_history_file_name, 'a')
         ids = self._get_history_ids_for_variant(variant_id, chromosome, start, ref, alt, gene, variant_type)
+        # Look up each possible id once, instead of scanning the ids of every export
+        indexed_ids = [(row_id, self.history.get(row_id)) for row_id in ids]
+        indexed_ids = [(row_id, exports) for row_id, exports in indexed_ids if exports]
 
-        for export_id in self.history:
-            possible_ids = [f'{export_id}_{row_id}' for row_id in ids]
-            export = self.history[export_id]
-
-            for possible_id in possible_ids:
-                variant_history = self._add_history_of_variant(possible_id, export, variant_history)
-                variant_history = self._add_history_of_variant(f'{possible_id}_dup0', export, variant_history)
-                variant_history = self._add_history_of_variant(f'{possible_id}_dup1', export, variant_history)
+        for export_id in self.exports:
+            for row_id, exports in indexed_ids:
+                if export_id in exports:
+                    suffixes = exports[export_id]
+                    variant_history += [f'{export_id}_{row_id}{suffix}' for suffix in HistorySorter.dup_suffixes if
+                                        suffix in suffixes]
 
             alternative_history = self.alternative_history[export_id]
             if 'transcript' in variant and 'c_dna' in variant:
@@ -176,48 +205,152 @@ class ConsensusFileGenerator:
                 if variant_id and variant_id not in variant_history:
                     variant_history.append(variant_id)
                     message = f'{variant_id} is invalid; will be replaced by correct variant {variant["id"]}\n'
-                    if incorrect_history_file:
-                        incorrect_history_file.write(f'{variant_id}\t{message}')
+                    if self.incorrect_history_file:
+                        self.incorrect_history_file.write(f'{variant_id}\t{message}')
 
-        if incorrect_history_file:
-            incorrect_history_file.close()
         return variant_history
 
-    def _create_consensus_line(self, variant_id, variant, variant_lab_classifications, labs):
+    def _create_consensus_row(self, variant_id, variant, variant_lab_classifications, labs):
         """
-        Create a line for one variant in the consensus table
+        Create a row for one variant in the consensus table
         :param variant_id: id of the variant in this format: hash of chr_pos_ref_alt_gene
         :param variant: one variant from consensus_data as passed to this object
         :param variant_lab_classifications: lab_classifications in the scope of one variant
         :param labs: a list with all labs in it (may be lowercase)
-        :return: a line in tsv format representing the specific variant
+        :return: a list with the fields of the row representing the specific variant
         """
-        line = f'{variant_id}'
+        row = [variant_id]
         # Straight forward columns that don't need a transformation
         simple_columns = ['chromosome', 'start', 'stop', 'ref', 'alt', 'gene', 'c_dna', 'transcript', 'protein', 'hgvs',
                           'consensus_classification']
-        # First add the straight forward columns to the line
-        for column in simple_columns:
-            line = self._add_simple_column(line, variant, column)
+        # First add the straight forward columns to the row
+        row += [self._get_simple_column(variant, column) for column in simple_columns]
 
         # Add lab classifications if present, count if classification is present
         matches = 0
+        hashed_variant = self._get_hashed_variant(variant)
         for lab in labs:
-            lab_class = self._get_lab_classification(variant_lab_classifications, lab, variant)
+            lab_class = self._get_lab_classification(variant_lab_classifications, lab, hashed_variant)
             # lab_class[1] is True if lab classification was present
             if lab_class[1]:
                 matches += 1
-            line += lab_class[0]
+            row += lab_class[0]
 
         classification = variant['consensus_classification']
-        line += self._get_match_count_if_consensus(matches, classification)
+        row.append(self._get_match_count_if_consensus(matches, classification))
 
-        history = ','.join(self._get_matching_history(variant))
-        line += f'\t{history}'
+        row.append(','.join(self._get_matching_history(variant)))
 
         # Add disease code (empty for now) and comments (= xref to comments table, so is same as variant_id)
-        line += f'\t\t{variant_id}\n'
-        return line
+        row += ['', variant_id]
+        return row
+
+    @contextmanager
+    def _open_incorrect_variant_history_file(self, file_name=None, mode='a'):
+        """
+        Opens the log of variants with incorrect history once, for as long as the consensus files are generated
+        :param file_name: the file to log to (default: the incorrect variant history file)
+        :param mode: the mode to open the file in, by default the variants are added to the end of the log
+        :return: context in which the log can be written to
+        """
+        if not self.incorrect_variant_history_file_name:
+            yield
+            return
+        file_name = file_name if file_name else self.incorrect_variant_history_file_name
+        with open(file_name, mode) as incorrect_history_file:
+            self.incorrect_history_file = incorrect_history_file
+            try:
+                yield
+            finally:
+                self.incorrect_history_file = None
+
+    def _write_variant(self, variant_id, consensus_writer, comments_writer):
+        variant = self.consensus[variant_id]
+        consensus_writer.write_row(self._create_consensus_row(variant_id, variant['consensus'],
+                                                              variant['lab_classifications'], self.labs))
+        comments_writer.write_row([variant_id, '-'])
+
+    @staticmethod
+    def _get_shards(variant_ids, number_of_shards):
+        """
+        Splits the variants in contiguous shards, so the files are the same as when they are generated at once if the
+        shards are concatenated in order
+        :param variant_ids: the ids of the variants in the order of the consensus
+        :param number_of_shards: the (maximum) number of shards
+        :return: list with a list of variant ids per shard
+        """
+        shard_size = max(math.ceil(len(variant_ids) / number_of_shards), 1)
+        return [variant_ids[start:start + shard_size] for start in range(0, len(variant_ids), shard_size)]
+
+    @staticmethod
+    def _get_shard_file(file_name, shard):
+        return f'{file_name}.{shard}.part'
+
+    @staticmethod
+    def _initialize_worker(file_generator):
+        """
+        Keeps the ConsensusFileGenerator in the worker process, so the consensus and the history are passed to each
+        worker once (with the fork start method they are shared with the worker instead of copied)
+        :param file_generator: the ConsensusFileGenerator
+        :return: None
+        """
+        ConsensusFileGenerator._worker_generator = file_generator
+
+    @staticmethod
+    def _generate_shard(variant_ids, shard_files):
+        return ConsensusFileGenerator._worker_generator._write_shard(variant_ids, shard_files)
+
+    def _write_shard(self, variant_ids, shard_files):
+        """
+        Writes the rows of a shard of the variants (without headers) to separate files
+        :param variant_ids: the ids of the variants in the shard
+        :param shard_files: tuple with the consensus, comments and incorrect variant history files of the shard
+        :return: the hashes that were used for the shard
+        """
+        consensus_shard, comments_shard, incorrect_history_shard = shard_files
+        self.hash_cache.used_hashes = {}
+        with TsvWriter(consensus_shard, self.buffer_size) as consensus_writer, \
+                TsvWriter(comments_shard, self.buffer_size) as comments_writer, \
+                self._open_incorrect_variant_history_file(incorrect_history_shard, 'w'):
+            for variant_id in variant_ids:
+                self._write_variant(variant_id, consensus_writer, comments_writer)
+        return self.hash_cache.used_hashes
+
+    def _generate_shards(self, consensus_writer, comments_writer, progress_bar):
+        """
+        Generates contiguous shards of the files in worker processes and concatenates them in the order of the
+        consensus. The logged variants with incorrect history and the used hashes are combined in the same order.
+        :param consensus_writer: the TsvWriter of the consensus file
+        :param comments_writer: the TsvWriter of the comments file
+        :param progress_bar: the progress bar to update when a shard is done
+        :return: None
+        """
+        shards = self._get_shards(list(self.consensus), self.workers * self.shards_per_worker)
+        shard_files = [(self._get_shard_file(consensus_writer.file_name, shard),
+                        self._get_shard_file(comments_writer.file_name, shard),
+                        self._get_shard_file(self.incorrect_variant_history_file_name, shard) if
+                        self.incorrect_variant_history_file_name else None) for shard in range(len(shards))]
+        progress = 0
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=self._initialize_worker,
+                                 initargs=(self,)) as executor:
+            futures = [executor.submit(self._generate_shard, variant_ids, files) for variant_ids, files in
+                       zip(shards, shard_files)]
+            sizes = dict(zip(futures, [len(variant_ids) for variant_ids in shards]))
+            for future in as_completed(futures):
+                progress += sizes[future]
+                progress_bar.update(progress)
+
+        with self._open_incorrect_variant_history_file():
+            for future, (consensus_shard, comments_shard, incorrect_history_shard) in zip(futures, shard_files):
+                self.hash_cache.update(future.result())
+                consensus_writer.append_file(consensus_shard)
+                comments_writer.append_file(comments_shard)
+                os.remove(consensus_shard)
+                os.remove(comments_shard)
+                if incorrect_history_shard:
+                    with open(incorrect_history_shard) as incorrect_history:
+                        self.incorrect_history_file.write(incorrect_history.read())
+                    os.remove(incorrect_history_shard)
 
     def generate_consensus_files(self):
         """
@@ -238,35 +371,21 @@ class ConsensusFileGenerator:
         progress_bar = progressbar.ProgressBar(max_value=len(self.consensus))
         progress = 0
 
-        # Create file content
-        consensus_file_content = ''
-        comments_file_content = ''
-
-        # Create headers
-        consensus_file_content += self.create_consensus_header(self.labs)
-        comments_file_content += 'id\tcomments\n'
-
-        # Open output files
-        consensus_file = open(consensus_filename, 'w')
-        comments_file = open(comments_filename, 'w')
-
-        for i, variant_id in enumerate(self.consensus):
-            variant = self.consensus[variant_id]
-            consensus_file_content += self._create_consensus_line(variant_id, variant['consensus'],
-                                                                  variant['lab_classifications'], self.labs)
-            comments_file_content += f'{variant_id}\t-\n'
-            if (i + 1) % 1000 == 0:
-                progress += 1000
-                progress_bar.update(progress)
-                consensus_file.write(consensus_file_content)
-                consensus_file_content = ''
-                comments_file.write(comments_file_content)
-                comments_file_content = ''
-
-        consensus_file.write(consensus_file_content)
-        comments_file.write(comments_file_content)
-        comments_file.close()
-        consensus_file.close()
+        with TsvWriter(consensus_filename, self.buffer_size) as consensus_writer, \
+                TsvWriter(comments_filename, self.buffer_size) as comments_writer:
+            # Create headers
+            consensus_writer.write_row(self._get_consensus_header_fields(self.labs))
+            comments_writer.write_row(['id', 'comments'])
+
+            if self.workers:
+                self._generate_shards(consensus_writer, comments_writer, progress_bar)
+            else:
+                with self._open_incorrect_variant_history_file():
+                    for i, variant_id in enumerate(self.consensus):
+                        self._write_variant(variant_id, consensus_writer, comments_writer)
+                        if (i + 1) % 1000 == 0:
+                            progress += 1000
+                            progress_bar.update(progress)
 
         progress_bar.finish()
         return consensus_filename, comments_filename
@@ -1,6 +1,8 @@
 import datetime
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import numpy
 import pandas
 import progressbar
 from termcolor import colored
@@ -14,8 +16,26 @@ class ConsensusReporter:
     """ConsensusReporter generates a log file with all opposites and on the bottom the counts in HTML format and a
     public consensus table."""
 
-    def __init__(self, consensus_csv, labs, public_consensus, prefix, output):
+    # Columns of the consensus table that are used by the reports
+    consensus_columns = ['id', 'chromosome', 'start', 'stop', 'ref', 'alt', 'gene', 'c_dna', 'transcript', 'protein',
+                         'hgvs', 'consensus_classification']
+    # Columns of the variants in the opposites report, followed by the classification of each lab
+    opposites_columns = ['chromosome', 'start', 'ref', 'alt', 'gene', 'transcript', 'c_dna']
+
+    def __init__(self, consensus_csv, labs, public_consensus, prefix, output, consensus_df=None, workers=None):
+        """
+        :param consensus_csv: the consensus tsv file as generated by ConsensusFileGenerator
+        :param labs: a list with all labs
+        :param public_consensus: the name of the public consensus table
+        :param prefix: the prefix of the output files
+        :param output: the folder to write the reports to
+        :param consensus_df: the consensus dataframe (see from_consensus), if specified the consensus_csv is not read
+        :param workers: the number of threads to write the reports with (None to write one report at a time)
+        """
         self.labs = labs
+        self.workers = workers
+        # Whether the type and simplification columns were added to the consensus dataframe
+        self.has_variant_columns = False
         report_id = self._get_month_and_year()
 
         self.opposites_file_name = output + prefix + 'opposites_report_{}.tsv'.format(report_id)
@@ -32,9 +52,76 @@ class ConsensusReporter:
         self.type_file = open(self.type_file_name, 'w')
         self.counts_html = open(self.counts_file_name, 'w')
 
-        # Prevent stop position from getting converted to float because it's optional
-        self.consensus_df = pandas.read_csv(consensus_csv, low_memory=False, converters={'stop': str},
-                                            na_values={'stop': ''}, sep='\t')
+        if consensus_df is not None:
+            self.consensus_df = consensus_df
+        else:
+            # Prevent stop position from getting converted to float because it's optional
+            self.consensus_df = pandas.read_csv(consensus_csv, low_memory=False, converters={'stop': str},
+                                                na_values={'stop': ''}, sep='\t')
+
+    @classmethod
+    def from_consensus(cls, consensus, labs, public_consensus, prefix, output, workers=None):
+        """
+        Creates a ConsensusReporter for the consensus in memory, instead of reading the consensus tsv file
+        :param consensus: consensus as generated by process_variants in ConsensusTableGenerator
+        :param labs: a list with all labs
+        :param public_consensus: the name of the public consensus table
+        :param prefix: the prefix of the output files
+        :param output: the folder to write the reports to
+        :param workers: the number of threads to write the reports with (None to write one report at a time)
+        :return: the ConsensusReporter
+        """
+        return cls(None, labs, public_consensus, prefix, output,
+                   consensus_df=cls.create_consensus_df(consensus, labs), workers=workers)
+
+    @staticmethod
+    def _convert_column(values):
+        """
+        Converts the values of a column like pandas.read_csv would: empty values are missing and columns with only
+        numbers are numeric
+        :param values: list with the values of the column as they are written to the consensus tsv
+        :return: Series with the converted values
+        """
+        column = pandas.Series(values, dtype=object).replace('', numpy.nan)
+        try:
+            return pandas.to_numeric(column)
+        except (ValueError, TypeError):
+            return column
+
+    @staticmethod
+    def create_consensus_df(consensus, labs):
+        """
+        Creates the consensus dataframe from the consensus in memory, the dataframe has the same values as when the
+        consensus tsv file generated by ConsensusFileGenerator is read
+        :param consensus: consensus as generated by process_variants in ConsensusTableGenerator
+        :param labs: a list with all labs
+        :return: dataframe with the columns of the consensus that are used by the reports
+        """
+        columns = {column: [] for column in ConsensusReporter.consensus_columns + labs + ['matches']}
+        one_lab = 'Classified by one lab'
+        for variant_id, variant in consensus.items():
+            variant_info = variant['consensus']
+            lab_classifications = variant['lab_classifications']
+            columns['id'].append(variant_id)
+            for column in ConsensusReporter.consensus_columns[1:]:
+                columns[column].append(str(variant_info[column]) if column in variant_info else '')
+            matches = 0
+            for lab in labs:
+                if lab_classifications[lab] == '':
+                    columns[lab].append('')
+                else:
+                    matches += 1
+                    columns[lab].append(
+                        Classifications.get_full_classification_from_abbreviation(lab_classifications[lab]))
+            # See ConsensusFileGenerator._get_match_count_if_consensus
+            classification = variant_info['consensus_classification']
+            has_matches = '(Likely)' in classification or classification == 'VUS' or classification == one_lab
+            columns['matches'].append(str(matches) if has_matches else '')
+
+        consensus_df = pandas.DataFrame(
+            {column: values if column == 'stop' else ConsensusReporter._convert_column(values) for column, values in
+             columns.items()})
+        return consensus_df
 
     def count_classifications(self):
         """
@@ -80,8 +167,9 @@ class ConsensusReporter:
 
         # Merge consensus classification with one lab
         public = consensus.append(one_lab, sort=True)
-        public['label'] = public.apply(
-            lambda x: '{}:{} {} {}>{}'.format(x.chromosome, str(x.start), x.gene, x.ref, x.alt), axis=1)
+        # Label format: chromosome:start gene ref>alt
+        public['label'] = public['chromosome'].astype(str) + ':' + public['start'].astype(str) + ' ' + \
+            public['gene'].astype(str) + ' ' + public['ref'].astype(str) + '>' + public['alt'].astype(str)
         public['c_notation'] = public['c_dna']
         public['p_notation'] = public['protein']
         public['classification'] = public['consensus_classification'].apply(
@@ -107,22 +195,33 @@ class ConsensusReporter:
         progress = progressbar.ProgressBar(max_value=8)
 
         print('Generating reports')
-        self.count_classifications()
+        # The columns and counts that are used by more than one report are computed once, the reports only read the
+        # consensus dataframe, so they can be written at the same time
+        self.add_variant_columns()
+        counts = self.count_classifications()
         progress.update(1)
         self.report.write('chromosome\tposition\tref\talt\tgene\ttranscript\tc_dna')
         for lab in self.labs:
             self.report.write('\t' + lab)
         self.report.write('\n')
-        self.write_opposites()
-        progress.update(2)
-        self.write_public_table()
-        progress.update(4)
-        self.write_variant_types()
-        progress.update(6)
-        self.write_count_output()
-        progress.update(7)
-        self.quality_check()
-        progress.update(8)
+        # Each report is written to its own file, with the number of progress steps it takes
+        reports = [(self.write_opposites, (), 1), (self.write_public_table, (), 2), (self.write_variant_types, (), 2),
+                   (self.write_count_output, (counts,), 1), (self.quality_check, (), 1)]
+        steps = 1
+        if self.workers:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(report, *arguments): report_steps for report, arguments, report_steps in
+                           reports}
+                for future in as_completed(futures):
+                    # Raise the error of a report that failed
+                    future.result()
+                    steps += futures[future]
+                    progress.update(steps)
+        else:
+            for report, arguments, report_steps in reports:
+                report(*arguments)
+                steps += report_steps
+                progress.update(steps)
         progress.finish()
 
         print('Generated [{}], [{}], [{}], [{}], [{}], and [{}]\n'.format(colored(self.opposites_file_name, 'blue'),
@@ -146,34 +245,39 @@ class ConsensusReporter:
         return datetime.datetime.now().strftime("%y%m")
 
     def write_opposites(self):
+        """
+        Writes the variants with an opposite classification to the opposites log file at once. Missing variant values
+        are written as nan and missing lab classifications as empty values.
+        :return: None
+        """
         opposites = self.consensus_df[self.consensus_df.consensus_classification == 'Opposite classifications']
-        for row in opposites.iterrows():
-            self._write_opposites_line(row[1])
+        columns = [opposites[column].astype(object).map(str) for column in self.opposites_columns]
+        columns += [opposites[lab].map(lambda classification: classification if type(classification) == str else '')
+                    for lab in self.labs]
+        self.report.write(''.join('\t'.join(row) + '\n' for row in zip(*columns)))
 
-    def _write_opposites_line(self, variant):
+    def add_variant_columns(self):
         """
-        Writes a variant with an opposite classification to the opposites log file.
-        :param variant: The variant to add to the file (Series with chromosome, stop, ref, alt, gene, labs, transcript and c_dna)
+        Adds the type of each variant and whether it needs simplification (Variants.need_simplification) to the
+        consensus dataframe, if they were not added yet
         :return: None
         """
-        classifications = {lab: variant[lab] for lab in self.labs if type(variant[lab]) == str}
-        self.report.write(
-            '{}\t{}\t{}\t{}\t{}\t{}\t{}'.format(variant.chromosome, variant.start, variant.ref, variant.alt,
-                                                variant.gene, variant.transcript, variant.c_dna))
-        for lab in self.labs:
-            if lab in classifications:
-                self.report.write('\t' + classifications[lab])
-            else:
-                self.report.write('\t')
-        self.report.write('\n')
-
-    def write_count_output(self):
+        if self.has_variant_columns:
+            return
+        self.consensus_df['type'] = Variants.get_variant_types(self.consensus_df['ref'], self.consensus_df['alt'])
+        self.consensus_df['simplification'] = Variants.need_simplifications(self.consensus_df['ref'],
+                                                                            self.consensus_df['alt'])
+        self.has_variant_columns = True
+
+    def write_count_output(self, counts=None):
         """
         Writes a HTML file with the consensus counts (how many times classifications were used)
+        :param counts: the number of variants per classification (see count_classifications), None to count them
         :return: None
         """
         moment = datetime.datetime.now().strftime('%B %Y')
-        counts = self.count_classifications()
+        if counts is None:
+            counts = self.count_classifications()
         single_counts = self.count_single_classifications()
         title = 'Counts for {} export'.format(moment)
         diagrams = CountFileWriter(counts, single_counts, title)
@@ -185,8 +289,7 @@ class ConsensusReporter:
         simplification to a log file.
         :return: None
         """
-        self.consensus_df['simplification'] = self.consensus_df.apply(
-            lambda x: Variants.need_simplification(x.ref, x.alt), axis=1)
+        self.add_variant_columns()
         columns = ['id', 'chromosome', 'start', 'stop', 'ref', 'alt', 'c_dna', 'protein', 'transcript', 'gene',
                    'consensus_classification'] + self.labs
         self.consensus_df.loc[lambda x: x.simplification].to_csv(self.log_file_name, index=False, columns=columns,
@@ -209,7 +312,7 @@ class ConsensusReporter:
         variants.
         :return: None
         """
-        self.consensus_df['type'] = self.consensus_df.apply(lambda x: Variants.get_variant_type(x.ref, x.alt), axis=1)
+        self.add_variant_columns()
 
         classifications = pandas.melt(self.consensus_df, id_vars=['id', 'type'], value_vars=self.labs, var_name='lab',
                                       value_name='classification')
@@ -0,0 +1,57 @@
+import hashlib
+import os
+import pickle
+
+
+class ConsensusSnapshot:
+    """
+    The ConsensusSnapshot persists the consensus of an export together with a digest of each lab variant it was
+    generated from, so the next export only needs to recompute the variants of which a lab variant changed
+    """
+
+    def __init__(self, labs, lab_digests=None, consensus=None, all_classifications=None):
+        """
+        :param labs: the labs the consensus was generated for (in order)
+        :param lab_digests: for each lab the digests of its variants ({lab: {lab_variant_id: digest}}), the digest is
+        None if the lab variant id was not unique
+        :param consensus: the consensus as generated by ConsensusTableGenerator
+        :param all_classifications: the classification counts of each variant as generated by ConsensusTableGenerator
+        """
+        self.labs = labs
+        self.lab_digests = lab_digests if lab_digests is not None else {lab: {} for lab in labs}
+        self.consensus = consensus if consensus is not None else {}
+        self.all_classifications = all_classifications if all_classifications is not None else {}
+
+    @staticmethod
+    def get_digest(variant):
+        """
+        Creates a short digest of all columns of a lab variant to detect if it changed since the previous export
+        :param variant: the variant as specified by the lab (a dictionary or a TsvRecord)
+        :return: the digest (bytes)
+        """
+        row = '\t'.join(variant.keys()) + '\n' + '\t'.join(map(str, variant.values()))
+        return hashlib.blake2b(row.encode('utf-8'), digest_size=16).digest()
+
+    def save(self, file_name):
+        """
+        Writes the snapshot to a file
+        :param file_name: the path of the file to write to
+        :return: None
+        """
+        with open(file_name, 'wb') as snapshot_file:
+            pickle.dump(self, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(file_name, labs):
+        """
+        Reads the snapshot of the previous export
+        :param file_name: the path of the snapshot file
+        :param labs: the labs of the current export
+        :return: the snapshot, or an empty snapshot if there is no snapshot file or it was created for other labs
+        """
+        if os.path.isfile(file_name):
+            with open(file_name, 'rb') as snapshot_file:
+                snapshot = pickle.load(snapshot_file)
+            if snapshot.labs == labs:
+                return snapshot
+        return ConsensusSnapshot(labs)
@@ -1,4 +1,5 @@
 from consensus.Classifications import Classifications
+from consensus.ConsensusSnapshot import ConsensusSnapshot
 
 import progressbar
 
@@ -9,14 +10,20 @@ class ConsensusTableGenerator:
     and whether the labs agree upon the classifications
     """
 
+    # The columns of the lab tables that are used to generate the consensus
+    lab_columns = ['id', 'chromosome', 'start', 'stop', 'ref', 'alt', 'gene', 'type', 'hgvs_g', 'hgvs_c', 'c_dna',
+                   'protein', 'transcript', 'classification']
+
     def __init__(self, lab_data):
         """
-        :param lab_data: lab data as generated by DataRetriever ({lab1: [{variant1}, {variant2}, ...], lab2: [...]})
+        :param lab_data: lab data as generated by DataRetriever ({lab1: [{variant1}, {variant2}, ...], lab2: [...]}),
+        the variants of a lab can also be an iterator (as created by TsvToListConverter.iterate) that is consumed once
         """
         self.lab_data = lab_data
         self.labs = [lab for lab in lab_data]
         self.consensus = {}
         self.all_classifications = {}
+        self.lab_digests = {}
         self.no_consensus = 'No consensus'
         self.opposite_consensus = 'Opposite classifications'
 
@@ -24,7 +31,7 @@ class ConsensusTableGenerator:
         """
         Adds a new unique variant to the consensus dictionary
         :param variant_id: the id of the variant (chr_pos_ref_alt_gene)
-        :param variant: the variant as specified by the lab
+        :param variant: the variant as specified by the lab (a dictionary or a TsvRecord)
         :param lab: the lab that saw the variant
         :return: None
         """
@@ -70,7 +77,7 @@ class ConsensusTableGenerator:
         """
         Updates a unique variant in the consensus dictionary if it already exists
         :param variant_id: the id of the variant in the consensus table (chr_pos_ref_alt_gene)
-        :param variant: the variant as specified by the lab
+        :param variant: the variant as specified by the lab (a dictionary or a TsvRecord)
         :param lab: the id of the lab
         :return: None
         """
@@ -101,26 +108,111 @@ class ConsensusTableGenerator:
                 classification = Classifications.transform_classification(lab_class)
                 self.consensus[variant_id]['consensus']['consensus_classification'] = classification
 
+    def _get_number_of_variants(self):
+        """
+        Counts the variants of all labs, if the variants of a lab are streamed their number is unknown up front
+        :return: the total number of lab variants or progressbar.UnknownLength
+        """
+        if all(hasattr(self.lab_data[lab], '__len__') for lab in self.lab_data):
+            return sum([len(self.lab_data[lab]) for lab in self.lab_data])
+        return progressbar.UnknownLength
+
+    @staticmethod
+    def _get_variant_id(lab, lab_variant_id):
+        """
+        Removes the lab prefix from the id of a lab variant to get the id of the variant in the consensus table
+        :param lab: the id of the lab
+        :param lab_variant_id: the id of the variant in the lab table (LAB_hash)
+        :return: the id of the variant in the consensus table
+        """
+        lab_id = lab.replace('_', '').upper() + '_'
+        return lab_variant_id.replace(lab_id, '')
+
+    def _process_variant(self, variant_id, variant, lab):
+        """
+        Adds the variant to the consensus if it does not exist yet, else updates it with the lab classification
+        :param variant_id: the id of the variant in the consensus table
+        :param variant: the variant as specified by the lab (a dictionary or a TsvRecord)
+        :param lab: the id of the lab
+        :return: None
+        """
+        if variant_id not in self.consensus:
+            self._add_new_variant(variant_id, variant, lab)
+        else:
+            self._update_variant_classification(variant_id, variant, lab)
+
     def process_variants(self):
         """
         For each lab, for each variant, check if it exists in the consensus,
         if not add new variant, else update variant with lab classification
         :return: consensus ({chr_pos_ref_alt:{variant info}})
         """
-        total_variants = sum([len(self.lab_data[lab]) for lab in self.lab_data])
+        total_variants = self._get_number_of_variants()
         current = 0
         print('\nProcessing variants')
         new_progress = progressbar.ProgressBar(max_value=total_variants)
         for lab in self.lab_data:
             lab_variants = self.lab_data[lab]
             for variant in lab_variants:
-                lab_id = lab.replace('_', '').upper() + '_'
-                variant_id = variant['id'].replace(lab_id, '')
-                if variant_id not in self.consensus:
-                    self._add_new_variant(variant_id, variant, lab)
-                else:
-                    self._update_variant_classification(variant_id, variant, lab)
+                self._process_variant(self._get_variant_id(lab, variant['id']), variant, lab)
+                current += 1
+                new_progress.update(current)
+        new_progress.finish()
+        return self.consensus
+
+    def _determine_changed_variants(self, snapshot):
+        """
+        Compares the digest of each lab variant with the digest in the snapshot of the previous export
+        :param snapshot: ConsensusSnapshot of the previous export
+        :return: the ids of the consensus variants of which a lab variant was added, changed or removed
+        """
+        changed_variants = set()
+        self.lab_digests = {}
+        for lab in self.lab_data:
+            previous_digests = snapshot.lab_digests.get(lab, {})
+            digests = self.lab_digests[lab] = {}
+            for variant in self.lab_data[lab]:
+                lab_variant_id = variant['id']
+                # A lab variant id that is not unique is always recomputed, its digest is unreliable
+                digest = None if lab_variant_id in digests else ConsensusSnapshot.get_digest(variant)
+                if digest is None or previous_digests.get(lab_variant_id) != digest:
+                    changed_variants.add(self._get_variant_id(lab, lab_variant_id))
+                digests[lab_variant_id] = digest
+            removed = [lab_variant_id for lab_variant_id in previous_digests if lab_variant_id not in digests]
+            changed_variants.update([self._get_variant_id(lab, lab_variant_id) for lab_variant_id in removed])
+        return changed_variants
+
+    def process_variants_incrementally(self, snapshot):
+        """
+        Generates the same consensus as process_variants, but only processes the variants of which a lab variant was
+        added, changed or removed since the snapshot of the previous export. The other variants are taken from the
+        snapshot in the order they are encountered, so the order of the consensus is the same as with process_variants.
+        The lab data is iterated twice, so it cannot be streamed.
+        :param snapshot: ConsensusSnapshot of the previous export (an empty snapshot processes all variants)
+        :return: consensus ({chr_pos_ref_alt:{variant info}})
+        """
+        print('\nComparing lab variants with the previous export')
+        changed_variants = self._determine_changed_variants(snapshot)
+        print(f'Processing {len(changed_variants)} changed variants')
+        new_progress = progressbar.ProgressBar(max_value=self._get_number_of_variants())
+        current = 0
+        for lab in self.lab_data:
+            for variant in self.lab_data[lab]:
+                variant_id = self._get_variant_id(lab, variant['id'])
+                if variant_id in changed_variants:
+                    self._process_variant(variant_id, variant, lab)
+                elif variant_id not in self.consensus:
+                    self.consensus[variant_id] = snapshot.consensus[variant_id]
+                    self.all_classifications[variant_id] = snapshot.all_classifications[variant_id]
                 current += 1
                 new_progress.update(current)
         new_progress.finish()
         return self.consensus
+
+    def create_snapshot(self):
+        """
+        Creates a snapshot of the consensus to process the next export incrementally, only available after
+        process_variants_incrementally
+        :return: ConsensusSnapshot of the consensus
+        """
+        return ConsensusSnapshot(self.labs, self.lab_digests, self.consensus, self.all_classifications)
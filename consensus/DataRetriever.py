@@ -1,18 +1,35 @@
+import os
+import itertools
 import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
 import progressbar
 
+from consensus.HistoryPartitions import HistoryPartitions
 from consensus.MolgenisConfigParser import MolgenisConfigParser as ConfigParser
+from consensus.ParsedFileCache import ParsedFileCache
 from consensus.TsvToListConverter import TsvToListConverter
 
 
 class DataRetriever:
     """DataRetriever retrieves the data from all lab tables and the history table"""
 
-    def __init__(self, labs, prefix, history, output_folder):
+    def __init__(self, labs, prefix, history, output_folder, streaming=False, lab_columns=None,
+                 history_columns=None, workers=None, cache=None, previous_exports=None, metrics=None):
         """
         :param labs: a list with the id's of the labs
         :param prefix: the prefix for all tables names in molgenis
-        :param server: the logged in molgenis client
+        :param history: the path to the history file or the folder with a partition per export (None to not retrieve
+        the history)
+        :param output_folder: the folder with the preprocessed lab files
+        :param streaming: if True, the data is not read into memory, but streamed row by row to its consumer
+        :param lab_columns: the columns to retrieve from the lab files (None for all columns)
+        :param history_columns: the columns to retrieve from the history file (None for all columns)
+        :param workers: the number of worker processes to parse the files with (None to parse each file in a thread)
+        :param cache: the folder to cache the parsed files in (None to always parse the files), not used when streaming
+        :param previous_exports: the exports of which the partitions are retrieved if the history is partitioned
+        :param metrics: the PipelineMetrics to record the retrieval of each lab in (None to not record it)
         """
         self.history_file = history
         self.labs = labs
@@ -21,65 +38,116 @@ class DataRetriever:
         self.history = []
         self.prefix = prefix
         self.progress = 0
+        self._progress_lock = threading.Lock()
         self.output_folder = output_folder
+        self.streaming = streaming
+        self.lab_columns = lab_columns
+        self.history_columns = history_columns
+        self.workers = workers
+        self.cache = cache
+        self.previous_exports = previous_exports if previous_exports is not None else []
+        self.metrics = metrics
 
-    def _determine_number_of_steps(self, list_of_files):
-        total_number_of_lines = 0
-        for filename in list_of_files:
-            total_number_of_lines += self._get_number_of_lines(filename)
-        return total_number_of_lines
+    def _get_lab_file(self, lab):
+        return f'{self.output_folder}{self.prefix}{lab}.tsv'
 
     @staticmethod
-    def _get_number_of_lines(filename):
-        with open(filename) as f:
-            return len(f.readlines())
+    def _determine_number_of_steps(list_of_files):
+        """
+        Estimates the work to retrieve the files from their size, so the files don't need to be read up front
+        :param list_of_files: the files to retrieve
+        :return: the total number of bytes of the files
+        """
+        return sum([os.path.getsize(filename) for filename in list_of_files])
+
+    def _create_executor(self, number_of_files):
+        """
+        Creates the executor to parse the files with, a pool of worker processes if a number of workers is specified
+        (parsing is CPU bound, so threads are serialized by the GIL), else a thread per file
+        :param number_of_files: the number of files to parse
+        :return: the executor
+        """
+        if self.workers:
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ThreadPoolExecutor(max_workers=max(number_of_files, 1))
+
+    @staticmethod
+    def _parse_timed(parse, file_name, columns):
+        """
+        Parses a file and measures how long it took, in the thread or process that parses the file
+        :param parse: the function to parse the file with
+        :param file_name: the path of the file
+        :param columns: the columns to retrieve from the file
+        :return: tuple with the parsed rows and the number of seconds it took to parse them
+        """
+        start = time.perf_counter()
+        rows = parse(file_name, columns)
+        return rows, time.perf_counter() - start
+
+    def _update_progress(self, steps):
+        with self._progress_lock:
+            self.progress += steps
+            self.progress_bar.update(self.progress)
 
     def retrieve_all_data(self):
         """
-        Retrieves lab data multi threaded (a thread per lab to make sure the data of each thread is separated properly)
+        Retrieves lab and history data in parallel, each file is parsed separately to make sure the data of each file is
+        separated properly
+        In streaming mode the data is not retrieved here, but an iterator over the rows of each file is created
         :return: None
         """
+        if self.streaming:
+            self._stream_all_data()
+            return
+
         print('Retrieving lab and history data')
 
-        list_of_files = [f'{self.output_folder}{self.prefix}{lab}.tsv' for lab in self.labs]
-        list_of_files.append(self.history_file)
+        lab_files = {lab: self._get_lab_file(lab) for lab in self.labs}
+        history_files = HistoryPartitions.get_history_files(self.history_file, self.previous_exports) if \
+            self.history_file else []
+        list_of_files = list(lab_files.values()) + history_files
         total_steps = self._determine_number_of_steps(list_of_files)
         self.progress_bar = progressbar.ProgressBar(max_value=total_steps)
 
-        threads = [self._start_thread_for_lab(lab) for lab in self.labs]
-        history_thread = threading.Thread(target=self._get_data_for_history, args=(self.history_file,))
-        history_thread.start()
-        threads.append(history_thread)
-
-        for thread in threads:
-            thread.join()
-
+        parse = ParsedFileCache(self.cache).parse if self.cache else TsvToListConverter.parse
+        with self._create_executor(len(list_of_files)) as executor:
+            lab_futures = {lab: executor.submit(self._parse_timed, parse, lab_files[lab], self.lab_columns) for lab in
+                           self.labs}
+            files = {lab_futures[lab]: lab_files[lab] for lab in self.labs}
+            history_futures = [executor.submit(parse, history_file, self.history_columns) for history_file in
+                               history_files]
+            files.update(zip(history_futures, history_files))
+            for future in as_completed(files):
+                self._update_progress(os.path.getsize(files[future]))
+
+        # Keep the labs in the order of the config, regardless of which file was parsed first
+        self.data = {}
+        for lab in self.labs:
+            self.data[lab], seconds = lab_futures[lab].result()
+            if self.metrics:
+                self.metrics.record_lab(lab, seconds, len(self.data[lab]))
+        # The partitions of the history are combined in the order of the exports
+        self.history = list(itertools.chain.from_iterable(future.result() for future in history_futures))
         self.all_lab_data = self.data
         self.progress_bar.finish()
 
-    def _get_data_for_lab(self, lab):
-        self.data[lab] = TsvToListConverter.parse(f'{self.output_folder}{self.prefix}{lab}.tsv')
-        self.progress += len(self.data[lab]) + 1
-        self.progress_bar.update(self.progress)
-
-    def _get_data_for_history(self, history):
-        self.history = TsvToListConverter.parse(f'{history}')
-
-    def _start_thread_for_lab(self, lab):
+    def _stream_all_data(self):
         """
-        Starts a thread that retrieves data for a single lab
-        :param lab: the id of the lab
-        :return: the thread
+        Creates iterators that stream the rows of the lab files and the history file when they are consumed
+        :return: None
         """
-        thread = threading.Thread(target=self._get_data_for_lab, args=(lab,))
-        thread.start()
-        return thread
+        print('Streaming lab and history data')
+        self.all_lab_data = {lab: TsvToListConverter.iterate(self._get_lab_file(lab), self.lab_columns)
+                             for lab in self.labs}
+        if self.history_file:
+            self.history = HistoryPartitions.iterate(self.history_file, self.previous_exports, self.history_columns)
 
 
 def main():
     config = ConfigParser('../config/config.txt')
-    history_file = f'{config.input}{config.prefix}{config.history}.tsv'
-    retriever = DataRetriever(config.labs, config.prefix, history_file, config.output)
+    history_file = HistoryPartitions.get_history(config.input, config.prefix, config.history)
+    retriever = DataRetriever(config.labs, config.prefix, history_file, config.output,
+                              previous_exports=config.previous)
     retriever.retrieve_all_data()
 
 
@@ -0,0 +1,87 @@
+import os
+import re
+
+from consensus.Hasher import Hasher
+
+
+class HashCache:
+    """
+    The HashCache memoizes the (shortened) hashes of variant ids, so each id is hashed only once. The hashes can be
+    persisted in a file to reuse them in the next export, only the hashes that were used in the export are kept.
+    """
+
+    # A line of the file: an id and the first 10 characters of its hash
+    line_pattern = re.compile(r'([^\t\n]*)\t([0-9a-f]{10})\n?')
+
+    def __init__(self, file_name=None):
+        """
+        :param file_name: the tab separated file to read the hashes from and to write the used hashes to (None to only
+        keep the hashes in memory)
+        """
+        self.file_name = file_name
+        self.hashes = {}
+        self.new_hashes = {}
+        # The hashes that were used (calculated or read from the cache) since the cache was created
+        self.used_hashes = {}
+        if self.file_name and os.path.isfile(self.file_name):
+            self.hashes = self._read_hashes(self.file_name)
+
+    @staticmethod
+    def _read_hashes(file_name):
+        """
+        Reads the hashes of a previous export, the cache is discarded if a line is not an id and a complete hash (for
+        instance because the file was damaged), so a wrong hash is never used
+        :param file_name: the tab separated file with an id and its hash on each line
+        :return: dictionary with the id as key and the hash as value, empty if the file is damaged
+        """
+        hashes = {}
+        with open(file_name) as hash_file:
+            for line in hash_file:
+                match = HashCache.line_pattern.fullmatch(line)
+                if match is None:
+                    print(f'Discarding the hash cache [{file_name}], it contains an invalid line: {line.strip()}')
+                    return {}
+                hashes[match.group(1)] = match.group(2)
+        return hashes
+
+    def hash(self, value):
+        """
+        Returns the first 10 characters of the hash of the value, the hash is only calculated if it's not cached
+        :param value: the value to hash (chr_pos_ref_alt_gene)
+        :return: the shortened hash
+        """
+        hashed = self.hashes.get(value)
+        if hashed is None:
+            hashed = Hasher.hash(value)[0:10]
+            self.hashes[value] = hashed
+            self.new_hashes[value] = hashed
+        self.used_hashes[value] = hashed
+        return hashed
+
+    def update(self, hashes):
+        """
+        Adds hashes that were used by another HashCache (for instance in a worker process), hashes that are already
+        cached are kept
+        :param hashes: dictionary with the hashed values as key and their hash as value
+        :return: None
+        """
+        for value, hashed in hashes.items():
+            if value not in self.hashes:
+                self.hashes[value] = hashed
+                self.new_hashes[value] = hashed
+            self.used_hashes[value] = self.hashes[value]
+
+    def save(self):
+        """
+        Writes the hashes that were used to the file if hashes were added or not used, so the hashes of ids that are no
+        longer in the consensus are removed. The file is replaced at once, so an interrupted run doesn't leave a damaged
+        file behind
+        :return: None
+        """
+        if self.file_name and (self.new_hashes or len(self.used_hashes) < len(self.hashes)):
+            temporary_file = self.file_name + '.tmp'
+            with open(temporary_file, 'w') as hash_file:
+                hash_file.writelines([f'{value}\t{hashed}\n' for value, hashed in self.used_hashes.items()])
+            os.replace(temporary_file, self.file_name)
+            self.hashes = dict(self.used_hashes)
+            self.new_hashes = {}
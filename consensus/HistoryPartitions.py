@@ -0,0 +1,61 @@
+import itertools
+import os
+
+from consensus.TsvToListConverter import TsvToListConverter
+
+
+class HistoryPartitions:
+    """
+    The history is either a single history file with all exports, or a folder with a partition (a history file) per
+    export named after the export (1810.tsv), so a new export only adds a partition and only the partitions of the
+    previous exports need to be read.
+    """
+
+    @staticmethod
+    def get_history(input_folder, prefix, history):
+        """
+        Determines where the history is, the folder with partitions is used if it exists
+        :param input_folder: the folder with the history
+        :param prefix: the prefix of the history table
+        :param history: the name of the history table
+        :return: the path of the history folder if it exists, else the path of the history file
+        """
+        history_folder = f'{input_folder}{prefix}{history}'
+        if os.path.isdir(history_folder):
+            return history_folder
+        return f'{history_folder}.tsv'
+
+    @staticmethod
+    def is_partitioned(history):
+        return os.path.isdir(history)
+
+    @staticmethod
+    def get_partition(history_folder, export):
+        return os.path.join(history_folder, f'{export}.tsv')
+
+    @staticmethod
+    def get_history_files(history, previous_exports):
+        """
+        Returns the files to read the history of the previous exports from
+        :param history: the path of the history file or the history folder
+        :param previous_exports: a list of ids of previous exports
+        :return: the history file, or the partitions of the previous exports in the order of the exports (exports
+        without a partition are skipped)
+        """
+        if not HistoryPartitions.is_partitioned(history):
+            return [history]
+        partitions = [HistoryPartitions.get_partition(history, export) for export in previous_exports]
+        return [partition for partition in partitions if os.path.isfile(partition)]
+
+    @staticmethod
+    def iterate(history, previous_exports, columns=None):
+        """
+        Streams the rows of the history of the previous exports
+        :param history: the path of the history file or the history folder
+        :param previous_exports: a list of ids of previous exports
+        :param columns: the columns to return for each row, None to return all columns
+        :return: generator of TsvRecords
+        """
+        return itertools.chain.from_iterable(
+            TsvToListConverter.iterate(history_file, columns) for history_file in
+            HistoryPartitions.get_history_files(history, previous_exports))
@@ -1,24 +1,50 @@
 class HistorySorter:
-    """The HistorySorter sorts the history by export"""
+    """The HistorySorter sorts the history by export and indexes it on row id"""
+
+    # Suffixes of history ids of variants that were duplicated in an export
+    dup_suffixes = ('', '_dup0', '_dup1')
+    # The columns of the history table that are used to sort the history
+    history_columns = ['id', 'gene', 'transcript', 'c_dna']
 
     def __init__(self, history_data, previous_exports):
         """
-        :param history_data: the complete content of the history table
+        :param history_data: the complete content of the history table (may be an iterator over its rows)
         :param previous_exports: a list of ids of previous exports (format: yymm, 1810 is october 2018)
         """
-        self.sorted_history = {export: [] for export in previous_exports}
+        self.exports = previous_exports
+        self.history_index = {}
         self.alternative_history = {export: {} for export in previous_exports}
         self.sort_history(history_data)
 
+    def _add_to_index(self, row_id, export, suffix):
+        """
+        Registers that the row id was seen in the export with the specified duplication suffix
+        :param row_id: the id of the history row without the export prefix
+        :param export: the id of the export (yymm)
+        :param suffix: the duplication suffix of the row ('', '_dup0' or '_dup1')
+        :return: None
+        """
+        exports = self.history_index.setdefault(row_id, {})
+        exports.setdefault(export, set()).add(suffix)
+
     def sort_history(self, unsorted_history):
         """
-        Store history of each export separately in a dictionary
+        Store history of each export separately in a dictionary and index the ids of the history rows
+        The index has the id without export prefix and duplication suffix as key and as value a dictionary with the
+        exports the id was seen in and the suffixes it was seen with ({row_id: {export: {suffix}}})
         :param unsorted_history: the complete history table
         """
         for variant in unsorted_history:
-            export = variant['id'].split('_')[0]
-            self.sorted_history[export].append(variant['id'])
+            history_id = variant['id']
+            export = history_id.split('_')[0]
+            if export not in self.alternative_history:
+                raise KeyError(export)
+            row_id = history_id[len(export) + 1:]
+            self._add_to_index(row_id, export, '')
+            for suffix in self.dup_suffixes[1:]:
+                if row_id.endswith(suffix):
+                    self._add_to_index(row_id[:-len(suffix)], export, suffix)
             if 'c_dna' in variant and 'transcript' in variant and '{}_{}:{}'.format(
                     variant['gene'], variant['transcript'], variant['c_dna']) not in self.alternative_history[export]:
                 self.alternative_history[export]['{}_{}:{}'.format(
-                    variant['gene'], variant['transcript'], variant['c_dna'])] = variant['id']
\ No newline at end of file
+                    variant['gene'], variant['transcript'], variant['c_dna'])] = history_id
@@ -0,0 +1,232 @@
+import json
+import os
+from collections.abc import Mapping
+
+from consensus.HistoryPartitions import HistoryPartitions
+from consensus.HistorySorter import HistorySorter
+from consensus.SortedIndex import SortedIndex
+
+
+class AlternativeHistory(Mapping):
+    """The alternative history of one export, read from the combined alternative history of the HistoryStore"""
+
+    def __init__(self, store, export):
+        """
+        :param store: the HistoryStore
+        :param export: the id of the export (yymm)
+        """
+        self.store = store
+        self.export = export
+
+    def __contains__(self, key):
+        return self.export in self.store.get_alternative_ids(key)
+
+    def __getitem__(self, key):
+        return self.store.get_alternative_ids(key)[self.export]
+
+    def __iter__(self):
+        return (key for key in self.store.alternative_index if key in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class HistoryStore:
+    """
+    The HistoryStore keeps the history on disk as sorted indices: one with the exports each row id was seen in and one
+    with the alternative history of all exports. Each row id is found with one binary search, and the files are only
+    read (memory-mapped) where they are searched, so the history doesn't need to be in memory. It can be used instead of
+    the history index and alternative history of the HistorySorter. The combined indices are built from the indices of
+    each export, so only the exports of which the history changed need to be read again.
+    """
+
+    manifest_file = 'manifest.json'
+
+    def __init__(self, folder, previous_exports):
+        """
+        :param folder: the folder with the files of the store (see build)
+        :param previous_exports: a list of ids of previous exports (format: yymm, 1810 is october 2018)
+        """
+        self.folder = folder
+        self.exports = previous_exports
+        self.ids = SortedIndex(self._get_file(None, 'ids'), self._get_file(None, 'exports'))
+        self.alternative_index = SortedIndex(self._get_file(None, 'alternative_keys'),
+                                             self._get_file(None, 'alternative_ids'))
+        self.alternative_history = {export: AlternativeHistory(self, export) for export in previous_exports}
+        # The alternative history of a variant is looked up for each export in a row, so the last lookup is kept
+        self._last_alternative = (None, {})
+
+    def _get_file(self, export, name):
+        """
+        Returns the path of a file of the store
+        :param export: the export the file belongs to (None for the combined indices of all exports)
+        :param name: the name of the file
+        :return: the path of the file
+        """
+        return os.path.join(self.folder, f'{export}_{name}.npy' if export else f'{name}.npy')
+
+    @staticmethod
+    def _get_source(history_file):
+        """
+        Describes a history file the store was built from, to know if the store needs to be built again
+        :param history_file: the path of the history file
+        :return: dictionary with the path, size and modification time of the history file, None if it doesn't exist
+        """
+        if not os.path.isfile(history_file):
+            return None
+        stat = os.stat(history_file)
+        return {'file': os.path.abspath(history_file), 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    @staticmethod
+    def _get_sources(history, previous_exports):
+        """
+        Describes the history file of each export: its partition if the history is partitioned, else the history file
+        :param history: the path of the history file or the history folder
+        :param previous_exports: a list of ids of previous exports
+        :return: dictionary with the export as key and the description of its history file as value
+        """
+        if HistoryPartitions.is_partitioned(history):
+            return {export: HistoryStore._get_source(HistoryPartitions.get_partition(history, export)) for export in
+                    previous_exports}
+        source = HistoryStore._get_source(history)
+        return {export: source for export in previous_exports}
+
+    @staticmethod
+    def _read_manifest(folder):
+        manifest_file = os.path.join(folder, HistoryStore.manifest_file)
+        if not os.path.isfile(manifest_file):
+            return {}
+        with open(manifest_file) as manifest:
+            return json.load(manifest)
+
+    @staticmethod
+    def get_outdated_exports(folder, history, previous_exports):
+        """
+        Determines which exports of the store were not built from the current history
+        :param folder: the folder of the store
+        :param history: the path of the history file or the history folder
+        :param previous_exports: a list of ids of previous exports
+        :return: list of exports that need to be built (again)
+        """
+        built = HistoryStore._read_manifest(folder)
+        sources = HistoryStore._get_sources(history, previous_exports)
+        return [export for export in previous_exports if export not in built or built[export] != sources[export]]
+
+    def _build_index(self, exports):
+        """
+        Combines the indices of the exports into one index of the row ids and one index of the alternative history
+        :param exports: a list of ids of the exports that are in the store
+        :return: None
+        """
+        ids = {}
+        alternative_history = {}
+        for export in exports:
+            for history_id in SortedIndex(self._get_file(export, 'ids')):
+                # The same as the history index of the HistorySorter: a duplicated row is also found without its suffix
+                ids.setdefault(history_id, []).append(export)
+                for suffix in HistorySorter.dup_suffixes[1:]:
+                    if history_id.endswith(suffix):
+                        ids.setdefault(history_id[:-len(suffix)], []).append(export + suffix)
+            alternative = SortedIndex(self._get_file(export, 'alternative_keys'),
+                                      self._get_file(export, 'alternative_ids'))
+            for key, history_id in alternative.items():
+                alternative_history.setdefault(key, []).append(history_id)
+        SortedIndex.save(self._get_file(None, 'ids'), list(ids), self._get_file(None, 'exports'),
+                         [' '.join(row_exports) for row_exports in ids.values()])
+        SortedIndex.save(self._get_file(None, 'alternative_keys'), list(alternative_history),
+                         self._get_file(None, 'alternative_ids'),
+                         [' '.join(history_ids) for history_ids in alternative_history.values()])
+
+    @staticmethod
+    def build(history_data, exports, folder, history):
+        """
+        Writes the sorted indices of the exports to the folder of the store and combines them with the indices of the
+        exports that were built before
+        :param history_data: the content of the history of the exports (may be an iterator over its rows)
+        :param exports: a list of ids of the exports to build, the history may only contain these exports
+        :param folder: the folder to write the files of the store to
+        :param history: the path of the history file or history folder, to recognize if the store is outdated
+        :return: None
+        """
+        ids = {export: [] for export in exports}
+        alternative_history = {export: {} for export in exports}
+        for variant in history_data:
+            history_id = variant['id']
+            export = history_id.split('_')[0]
+            if export not in ids:
+                raise KeyError(export)
+            ids[export].append(history_id[len(export) + 1:])
+            if 'c_dna' in variant and 'transcript' in variant:
+                # The first row with the alternative id is used, like in HistorySorter
+                alternative_history[export].setdefault(
+                    '{}_{}:{}'.format(variant['gene'], variant['transcript'], variant['c_dna']), history_id)
+
+        os.makedirs(folder, exist_ok=True)
+        store = HistoryStore(folder, exports)
+        for export in exports:
+            SortedIndex.save(store._get_file(export, 'ids'), list(dict.fromkeys(ids[export])))
+            alternative = alternative_history[export]
+            SortedIndex.save(store._get_file(export, 'alternative_keys'), list(alternative),
+                             store._get_file(export, 'alternative_ids'), list(alternative.values()))
+        # The manifest is written last, so an interrupted build is built again
+        manifest = HistoryStore._read_manifest(folder)
+        manifest.update(HistoryStore._get_sources(history, exports))
+        store._build_index(list(manifest))
+        with open(os.path.join(folder, HistoryStore.manifest_file), 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+
+    @staticmethod
+    def update(folder, history, previous_exports, columns=None):
+        """
+        Builds the exports of which the history changed since the store was built and opens the store
+        If the history is partitioned, only the partitions of the changed exports are read, else the complete history
+        file is read when one of the exports changed
+        :param folder: the folder of the store
+        :param history: the path of the history file or the history folder
+        :param previous_exports: a list of ids of previous exports
+        :param columns: the columns of the history to read (see HistorySorter.history_columns)
+        :return: the HistoryStore
+        """
+        outdated = HistoryStore.get_outdated_exports(folder, history, previous_exports)
+        if HistoryPartitions.is_partitioned(history):
+            if outdated:
+                HistoryStore.build(HistoryPartitions.iterate(history, outdated, columns), outdated, folder, history)
+        elif outdated:
+            HistoryStore.build(HistoryPartitions.iterate(history, previous_exports, columns), previous_exports,
+                               folder, history)
+        store = HistoryStore(folder, previous_exports)
+        if not os.path.isfile(store._get_file(None, 'ids')):
+            # A store that was built before the indices were combined only has the indices of each export
+            store._build_index(list(HistoryStore._read_manifest(folder)))
+        return store
+
+    def get(self, row_id):
+        """
+        Looks up in which exports a row id was seen and with which duplication suffixes, the same as the history index
+        of the HistorySorter
+        :param row_id: the id of the history row without the export prefix
+        :return: dictionary with the exports the id was seen in and the suffixes it was seen with ({export: {suffix}}),
+        None if the id is not in the history
+        """
+        row_exports = self.ids.get(row_id)
+        if row_exports is None:
+            return None
+        exports = {}
+        for row_export in row_exports.split(' '):
+            export, _, suffix = row_export.partition('_')
+            if export in self.exports:
+                exports.setdefault(export, set()).add('_' + suffix if suffix else '')
+        return exports if exports else None
+
+    def get_alternative_ids(self, key):
+        """
+        Looks up the alternative history of a variant in all exports
+        :param key: the alternative id of the variant (gene_transcript:c_dna)
+        :return: dictionary with the export as key and the history id as value, empty if the key is not in the history
+        """
+        last_key, history_ids = self._last_alternative
+        if key != last_key:
+            value = self.alternative_index.get(key)
+            history_ids = {history_id.split('_')[0]: history_id for history_id in value.split(' ')} if value else {}
+            self._last_alternative = (key, history_ids)
+        return history_ids
@@ -0,0 +1,84 @@
+from consensus.TsvRecord import TsvRecord
+from consensus.TsvToListConverter import TsvToListConverter
+from consensus.TsvWriter import TsvWriter
+
+
+class LabFileRewriter:
+    """
+    The LabFileRewriter rewrites a raw lab file to the lab file that is uploaded: the id of each variant is replaced by
+    a lab specific id, which is also used as comments id. The rewritten rows can be consumed while they are written, so
+    the consensus can be generated in the same pass over the raw lab file.
+    """
+
+    def __init__(self, lab, raw_file, lab_file, comments):
+        """
+        :param lab: the id of the lab
+        :param raw_file: the path of the raw lab file
+        :param lab_file: the path to write the rewritten lab file to
+        :param comments: the TsvWriter of the comments file to add the ids of the lab variants to
+        """
+        self.lab = lab
+        self.raw_file = raw_file
+        self.lab_file = lab_file
+        self.comments = comments
+
+    @staticmethod
+    def get_id(variant_id, lab):
+        prefix = lab.upper().replace('_', '') + '_'
+        # Get first 10 of hash
+        return prefix + variant_id[0:10]
+
+    @staticmethod
+    def create_comments_file(file_name):
+        comments = TsvWriter(file_name)
+        comments.write_row(['"id"', '"comments"'])
+        return comments
+
+    @staticmethod
+    def _get_comment_fields(comment_id):
+        return ['"{}"'.format(comment_id), '"-"']
+
+    def iterate(self, columns=None):
+        """
+        Rewrites the raw lab file one row at a time and yields each rewritten row
+        :param columns: the columns to yield for each row, None to yield all columns
+        :return: generator of TsvRecords, the same as TsvToListConverter.iterate of the rewritten lab file
+        """
+        with open(self.raw_file) as raw_file, TsvWriter(self.lab_file) as lab_file:
+            id_pos = 0
+            comments_idx = 0
+            positions = []
+            record_columns = {}
+            for i, line in enumerate(raw_file):
+                line = line.strip('\n').split('\t')
+                if i == 0:
+                    id_pos = line.index('id')
+                    comments_idx = line.index('comments')
+                    del line[comments_idx]
+                    del line[id_pos]
+                    line += ['comments', 'id']
+                    lab_file.write_row(line)
+                    header = [column.replace('"', '') for column in line]
+                    selected = TsvToListConverter._select_columns(
+                        TsvToListConverter._determine_columns_from_header(header), columns)
+                    record_columns = {column: position for position, column in enumerate(selected)}
+                    positions = list(selected.values())
+                else:
+                    variant_id = line[id_pos]
+                    lab_variant_id = self.get_id(variant_id, self.lab)
+                    del line[comments_idx]
+                    del line[id_pos]
+                    # Append it twice, once for comment, once for id
+                    line.append(lab_variant_id)
+                    line.append(lab_variant_id)
+                    lab_file.write_row(line)
+                    self.comments.write_row(self._get_comment_fields(lab_variant_id))
+                    yield TsvRecord(record_columns, tuple([line[position].replace('"', '') for position in positions]))
+
+    def rewrite(self):
+        """
+        Rewrites the complete raw lab file
+        :return: None
+        """
+        for _ in self.iterate(columns=[]):
+            pass
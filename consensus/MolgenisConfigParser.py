@@ -9,6 +9,29 @@ class MolgenisConfigParser:
         self.previous = config['previous']
         self.input = config['input']
         self.output = config['output']
+        # Optional settings
+        self.streaming = self._is_enabled(config.get('streaming'))
+        self.workers = int(config['workers']) if 'workers' in config else None
+        self.report_workers = int(config['report_workers']) if 'report_workers' in config else None
+        self.snapshot = config.get('snapshot')
+        self.engine = config.get('engine', 'default')
+        self.hash_cache = config.get('hash_cache')
+        self.cache = config.get('cache')
+        self.history_store = config.get('history_store')
+        self.fused = self._is_enabled(config.get('fused'))
+        # Upload settings
+        self.molgenis_url = config.get('molgenis_url')
+        self.upload_batch_size = int(config.get('upload_batch_size', 1000))
+        self.upload_concurrency = int(config.get('upload_concurrency', 4))
+
+    @staticmethod
+    def _is_enabled(value):
+        """
+        Interprets the value of an optional on/off setting
+        :param value: the value of the setting as specified in the config (None if not specified)
+        :return: True if the setting is turned on, False if not
+        """
+        return value is not None and value.lower() in ['true', 'yes', '1']
 
     @staticmethod
     def parse(file):
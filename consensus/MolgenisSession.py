@@ -0,0 +1,226 @@
+import http.client
+import json
+import queue
+import time
+import urllib.parse
+
+
+class UncertainRequestError(ConnectionError):
+    """A request that changes data failed in a way that doesn't tell whether the server applied it"""
+
+
+class MolgenisSession:
+    """
+    The MolgenisSession sends requests to the REST API of a MOLGENIS server over a pool of persistent connections, so
+    requests from several threads reuse connections instead of connecting for each request. Idempotent requests that
+    fail because of the connection or the server (5xx, 429) are retried with an increasing wait in between. Other
+    requests are only retried when the server didn't receive them, see add_entities for how added rows are retried.
+    """
+
+    # Statuses of requests that may succeed when they are sent again
+    retry_statuses = {429, 500, 502, 503, 504}
+    # Statuses of requests that the server rejected without processing them
+    rejected_statuses = {429}
+    # Methods of which the request can be sent again without changing the result
+    idempotent_methods = {'GET', 'HEAD', 'PUT', 'DELETE'}
+    # The number of ids that are looked up in one request, more ids make the url too long for some proxies
+    id_query_size = 100
+
+    def __init__(self, url, token=None, pool_size=4, retries=5, backoff=1.0, timeout=300):
+        """
+        :param url: the url of the MOLGENIS server (https://vkgl.molgeniscloud.org)
+        :param token: the token to authenticate with (None to login later or send anonymous requests)
+        :param pool_size: the number of connections to keep open
+        :param retries: the number of times a failed request is retried
+        :param backoff: the number of seconds to wait before the first retry, doubled for each next retry
+        :param timeout: the number of seconds to wait for a response
+        """
+        parsed_url = urllib.parse.urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parsed_url.scheme == 'https' else \
+            http.client.HTTPConnection
+        self.host = parsed_url.netloc
+        self.base_path = parsed_url.path.rstrip('/')
+        self.token = token
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.connections = queue.LifoQueue()
+        for _ in range(pool_size):
+            self.connections.put(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _get_headers(self):
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if self.token:
+            headers['x-molgenis-token'] = self.token
+        return headers
+
+    def _send(self, method, path, body):
+        """
+        Sends a request over a connection of the pool, waits for a connection if all connections are in use
+        :param method: the HTTP method
+        :param path: the path of the API endpoint (/api/v2/vkgl_consensus)
+        :param body: the encoded body (None to send no body)
+        :return: tuple with the status and the body of the response, the status is None if the server could not be
+        connected to (so the request was never sent)
+        """
+        connection = self.connections.get()
+        try:
+            if connection is None:
+                connection = self.connection_class(self.host, timeout=self.timeout)
+                try:
+                    connection.connect()
+                except OSError:
+                    return None, b''
+            connection.request(method, self.base_path + path, body=body, headers=self._get_headers())
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            # A broken connection is replaced by a new one on the next request
+            connection.close()
+            connection = None
+            raise
+        finally:
+            if connection is not None and connection.sock is None:
+                connection = None
+            self.connections.put(connection)
+
+    def _wait(self, attempt):
+        time.sleep(self.backoff * 2 ** attempt)
+
+    def request(self, method, path, data=None):
+        """
+        Sends a request to the REST API. A request is retried if it could not be sent or was rejected by the server,
+        and idempotent requests are also retried if the connection or the server failed.
+        :param method: the HTTP method
+        :param path: the path of the API endpoint (/api/v2/vkgl_consensus)
+        :param data: the data to send as JSON (None to send no body)
+        :return: the JSON of the response, None if the response has no body
+        :raises UncertainRequestError: if a request that is not idempotent failed after it was sent, so it may have
+        been applied
+        """
+        body = json.dumps(data).encode('utf-8') if data is not None else None
+        idempotent = method in self.idempotent_methods
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                status, response = self._send(method, path, body)
+            except (http.client.HTTPException, OSError) as error:
+                if not idempotent:
+                    raise UncertainRequestError(f'{method} {path} failed: {error}') from error
+                if last_attempt:
+                    raise ConnectionError(f'{method} {path} failed: {error}') from error
+            else:
+                if status is None:
+                    # The server could not be connected to, so the request can always be sent again
+                    if last_attempt:
+                        raise ConnectionError(f'{method} {path} failed: could not connect to {self.host}')
+                elif status < 300:
+                    return json.loads(response) if response else None
+                else:
+                    message = f'{method} {path} failed with status {status}: {response.decode("utf-8", "replace")}'
+                    if status in self.retry_statuses and not idempotent and status not in self.rejected_statuses:
+                        raise UncertainRequestError(message)
+                    if status not in self.retry_statuses or last_attempt:
+                        raise IOError(message)
+            self._wait(attempt)
+
+    def login(self, username, password):
+        """
+        Logs in and uses the token of the user for the next requests
+        :param username: the name of the user
+        :param password: the password of the user
+        :return: None
+        """
+        self.token = None
+        self.token = self.request('POST', '/api/v1/login', {'username': username, 'password': password})['token']
+
+    def get_existing_ids(self, entity_type, id_attribute, ids):
+        """
+        Looks up which of the ids are in a table
+        :param entity_type: the id of the table (vkgl_consensus)
+        :param id_attribute: the name of the id attribute of the table
+        :param ids: list of ids to look up
+        :return: set with the ids that are in the table
+        """
+        existing = set()
+        for start in range(0, len(ids), self.id_query_size):
+            chunk = ids[start:start + self.id_query_size]
+            quoted_ids = ','.join('"{}"'.format(row_id.replace('\\', '\\\\').replace('"', '\\"')) for row_id in chunk)
+            query = urllib.parse.urlencode({'attrs': id_attribute, 'num': len(chunk),
+                                            'q': f'{id_attribute}=in=({quoted_ids})'})
+            response = self.request('GET', f'/api/v2/{urllib.parse.quote(entity_type)}?{query}')
+            existing.update(item[id_attribute] for item in response['items'])
+        return existing
+
+    def _is_added(self, entity_type, id_attribute, ids):
+        """
+        Looks up if the rows of a request were added, the rows of a request are added in one transaction so either all
+        or none of them are
+        :param entity_type: the id of the table (vkgl_consensus)
+        :param id_attribute: the name of the id attribute of the table
+        :param ids: list with the ids of the rows
+        :return: True if all rows were added, False if none of them were
+        """
+        existing = self.get_existing_ids(entity_type, id_attribute, ids)
+        if existing and len(existing) < len(set(ids)):
+            raise IOError(f'Adding rows to {entity_type} was partially applied: {len(existing)} of {len(ids)} rows '
+                          f'were added')
+        return bool(existing)
+
+    def add_entities(self, entity_type, entities, id_attribute='id', resumed=False):
+        """
+        Adds rows to a table. If it is unknown whether the server added the rows (for instance after a gateway
+        timeout), the ids of the rows are looked up: the rows are only sent again if they were not added.
+        :param entity_type: the id of the table (vkgl_consensus)
+        :param entities: list with a dictionary per row
+        :param id_attribute: the name of the id attribute of the table
+        :param resumed: True if the rows may have been added by an upload that was interrupted, if the server rejects
+        the rows they are then looked up as well
+        :return: None
+        """
+        path = f'/api/v2/{urllib.parse.quote(entity_type)}'
+        ids = [entity[id_attribute] for entity in entities]
+        for attempt in range(self.retries + 1):
+            try:
+                self.request('POST', path, {'entities': entities})
+                return
+            except UncertainRequestError:
+                if self._is_added(entity_type, id_attribute, ids):
+                    return
+                if attempt == self.retries:
+                    raise
+            except ConnectionError:
+                raise
+            except IOError:
+                # MOLGENIS rejects rows with ids it already has
+                if resumed and self._is_added(entity_type, id_attribute, ids):
+                    return
+                raise
+            self._wait(attempt)
+
+    def delete_all(self, entity_type):
+        """
+        Deletes all rows of a table
+        :param entity_type: the id of the table (vkgl_consensus)
+        :return: None
+        """
+        self.request('DELETE', f'/api/v1/{urllib.parse.quote(entity_type)}')
+
+    def close(self):
+        """
+        Closes the connections of the pool
+        :return: None
+        """
+        connections = []
+        while not self.connections.empty():
+            connections.append(self.connections.get())
+        for connection in connections:
+            if connection is not None:
+                connection.close()
+            self.connections.put(None)
@@ -0,0 +1,166 @@
+import itertools
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import progressbar
+from termcolor import colored
+
+from consensus.MolgenisConfigParser import MolgenisConfigParser as ConfigParser
+from consensus.MolgenisSession import MolgenisSession
+from consensus.TsvToListConverter import TsvToListConverter
+from consensus.UploadProgress import UploadProgress
+
+
+class MolgenisUploader:
+    """
+    The MolgenisUploader replaces the tables of an export in MOLGENIS with the generated files, in the order of the
+    mcmd scripts (tables are deleted before the tables they refer to and imported after them). The rows of each file
+    are streamed to the REST API in batches, several batches at the same time.
+    """
+
+    def __init__(self, session, folder, prefix, labs, tables, progress=None, batch_size=1000, concurrency=4):
+        """
+        :param session: the MolgenisSession to send the requests with
+        :param folder: the folder with the generated files (the output folder)
+        :param prefix: the prefix for all tables names in molgenis
+        :param labs: a list with the id's of the labs
+        :param tables: dictionary with the ids of the consensus table (consensus_table) and the consensus comments table
+        (comments_table)
+        :param progress: the UploadProgress to resume the upload with (default: progress that is only kept in memory)
+        :param batch_size: the number of rows to add in one request (MOLGENIS accepts at most 1000)
+        :param concurrency: the maximum number of batches that are uploaded at the same time
+        """
+        self.session = session
+        self.folder = folder
+        self.prefix = prefix
+        self.labs = labs
+        self.tables = tables
+        self.progress = progress if progress is not None else UploadProgress()
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+    def get_steps(self):
+        """
+        Returns the steps of the upload, in the order of vkgl_cleanup_consensus, vkgl_cleanup_labs, vkgl_import_labs and
+        the imports of the step-by-step guide
+        :return: list of tuples with the action (delete or import) and the id of the table
+        """
+        lab_tables = [self.prefix + lab for lab in self.labs]
+        consensus = self.tables['consensus_table']
+        consensus_comments = self.tables['comments_table']
+        comments = self.prefix + 'comments'
+        public_consensus = self.prefix + 'public_consensus'
+        return [('delete', consensus), ('delete', consensus_comments)] + \
+            [('delete', table) for table in lab_tables] + \
+            [('delete', comments), ('import', comments)] + \
+            [('import', table) for table in lab_tables] + \
+            [('import', consensus_comments), ('import', consensus), ('delete', public_consensus),
+             ('import', public_consensus)]
+
+    @staticmethod
+    def _get_entity(row):
+        # Empty values are left out, so they are stored as missing values
+        return {column: value for column, value in row.items() if value != ''}
+
+    def _get_batches(self, file_name):
+        """
+        Reads the rows of a file in batches, the file is never completely in memory
+        :param file_name: the path of the file
+        :return: generator of tuples with the number of the batch and a list with the entities of the batch
+        """
+        rows = TsvToListConverter.iterate(file_name)
+        for batch in itertools.count():
+            entities = [self._get_entity(row) for row in itertools.islice(rows, self.batch_size)]
+            if not entities:
+                return
+            yield batch, entities
+
+    @staticmethod
+    def _get_id_attribute(entity):
+        # The public consensus has an ID column instead of an id column
+        return 'id' if 'id' in entity else 'ID'
+
+    def _get_file_name(self, table):
+        return f'{self.folder}{table}.tsv'
+
+    def _add_batch(self, table, batch, entities, resumed):
+        self.session.add_entities(table, entities, self._get_id_attribute(entities[0]), resumed)
+        self.progress.add_batch(table, batch)
+        return len(entities)
+
+    def import_table(self, table):
+        """
+        Adds the rows of the file of a table to the table, the batches that were already uploaded from the same file are
+        skipped. If the import of the table was interrupted, batches that were added but not recorded before the
+        interruption are recognized when MOLGENIS rejects their ids.
+        :param table: the id of the table, the name of the file without extension
+        :return: None
+        """
+        file_name = self._get_file_name(table)
+        resumed = self.progress.is_started(table)
+        uploaded = self.progress.get_batches(table, UploadProgress.get_file_key(file_name, self.batch_size))
+        print(f'Uploading [{colored(file_name, "blue")}] to [{table}]')
+        progress_bar = progressbar.ProgressBar(max_value=progressbar.UnknownLength)
+        rows = len(uploaded) * self.batch_size
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = set()
+            for batch, entities in self._get_batches(file_name):
+                if batch in uploaded:
+                    continue
+                # Only read the next batches when a batch is done, so at most twice the concurrency is in memory
+                if len(pending) >= self.concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    rows += sum(future.result() for future in done)
+                    progress_bar.update(rows)
+                pending.add(executor.submit(self._add_batch, table, batch, entities, resumed))
+            for future in pending:
+                rows += future.result()
+                progress_bar.update(rows)
+        progress_bar.finish()
+
+    def delete_table(self, table):
+        print(f'Deleting the rows of [{table}]')
+        self.session.delete_all(table)
+
+    def upload(self):
+        """
+        Runs the steps of the upload that are not done yet
+        :return: None
+        :raises IOError: if a file of which batches were uploaded changed since (the upload can't be resumed then)
+        """
+        steps = self.get_steps()
+        file_keys = {table: UploadProgress.get_file_key(self._get_file_name(table), self.batch_size) for action, table
+                     in steps if action == 'import'}
+        changed_tables = self.progress.get_changed_tables(file_keys)
+        if changed_tables:
+            raise IOError(f'The files of {", ".join(changed_tables)} changed since the interrupted upload, remove '
+                          f'[{self.progress.file_name}] to upload all tables again')
+        for action, table in steps:
+            step = f'{action} {table}'
+            if self.progress.is_done(step):
+                continue
+            if action == 'delete':
+                self.delete_table(table)
+            else:
+                self.import_table(table)
+            self.progress.mark_done(step)
+        self.progress.clear()
+
+
+def main(config_file):
+    config = ConfigParser(config_file)
+    token = os.environ.get('MOLGENIS_TOKEN')
+    if not token:
+        sys.exit('Set the MOLGENIS_TOKEN environment variable to the token of the user to upload with')
+    concurrency = config.upload_concurrency
+    with MolgenisSession(config.molgenis_url, token, pool_size=concurrency) as session:
+        progress = UploadProgress(f'{config.output}upload_progress.json')
+        tables = {'consensus_table': config.prefix + config.consensus,
+                  'comments_table': config.prefix + config.comments}
+        MolgenisUploader(session, config.output, config.prefix, config.labs, tables, progress,
+                         batch_size=config.upload_batch_size, concurrency=concurrency).upload()
+
+
+if __name__ == '__main__':
+    main('config/config.txt')
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import pickle
+import shutil
+
+from consensus.TsvRecord import TsvRecord
+from consensus.TsvToListConverter import TsvToListConverter
+
+
+class ParsedFileCache:
+    """
+    The ParsedFileCache keeps the parsed rows of tsv files in a binary file per tsv file, so a tsv file that didn't
+    change since it was parsed before doesn't need to be parsed again
+    """
+
+    def __init__(self, folder):
+        """
+        :param folder: the folder to keep the cache files in
+        """
+        self.folder = folder
+
+    def _get_cache_file(self, filename):
+        return os.path.join(self.folder, os.path.basename(filename) + '.pickle')
+
+    @staticmethod
+    def _get_file_hash(filename):
+        """
+        Hashes the content of a file, to recognize a file that was touched or copied without changing it
+        :param filename: the path of the file
+        :return: the hash of the file (bytes)
+        """
+        file_hash = hashlib.blake2b(digest_size=16)
+        with open(filename, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b''):
+                file_hash.update(block)
+        return file_hash.digest()
+
+    def _load(self, filename, columns):
+        """
+        Reads the cached rows of a file
+        :param filename: the path of the tsv file
+        :param columns: the columns the rows should have
+        :return: list of TsvRecords, or None if the file was not cached or changed since it was cached
+        """
+        cache_file = self._get_cache_file(filename)
+        if not os.path.isfile(cache_file):
+            return None
+        with open(cache_file, 'rb') as cached:
+            key = pickle.load(cached)
+            if key['file'] != os.path.abspath(filename) or key['columns'] != columns:
+                return None
+            stat = os.stat(filename)
+            # The size and modification time identify an unchanged file without reading it
+            if (key['size'], key['mtime']) != (stat.st_size, stat.st_mtime_ns):
+                if key['hash'] != self._get_file_hash(filename):
+                    return None
+                # The file was touched without changing, the next run recognizes it by its size and time again
+                key.update({'size': stat.st_size, 'mtime': stat.st_mtime_ns})
+                self._replace_key(filename, key, cached)
+            record_columns, values = pickle.load(cached)
+        return [TsvRecord(record_columns, row) for row in values]
+
+    def _replace_key(self, filename, key, cached):
+        """
+        Writes the cache file again with another key, the cached rows are copied without unpickling them
+        :param filename: the path of the tsv file
+        :param key: the new key of the cache file
+        :param cached: the opened cache file, positioned after the old key
+        :return: None, the opened cache file is positioned after the old key again
+        """
+        rows_start = cached.tell()
+        temporary_file = self._get_cache_file(filename) + '.tmp'
+        with open(temporary_file, 'wb') as replacement:
+            pickle.dump(key, replacement, protocol=pickle.HIGHEST_PROTOCOL)
+            shutil.copyfileobj(cached, replacement)
+        os.replace(temporary_file, self._get_cache_file(filename))
+        cached.seek(rows_start)
+
+    def _save(self, filename, columns, records, file_hash):
+        """
+        Writes the rows of a file to its cache file
+        :param filename: the path of the tsv file
+        :param columns: the columns that were selected when the file was parsed
+        :param records: the parsed rows (TsvRecords)
+        :param file_hash: the hash of the tsv file (see _get_file_hash)
+        :return: None
+        """
+        stat = os.stat(filename)
+        key = {'file': os.path.abspath(filename), 'columns': columns, 'size': stat.st_size,
+               'mtime': stat.st_mtime_ns, 'hash': file_hash}
+        # All rows of a file share their columns, so only their values are stored for each row
+        record_columns = records[0]._columns if len(records) > 0 else {}
+        values = [record._values for record in records]
+        os.makedirs(self.folder, exist_ok=True)
+        # Write to a temporary file first, so an interrupted run doesn't leave a broken cache file behind
+        temporary_file = self._get_cache_file(filename) + '.tmp'
+        with open(temporary_file, 'wb') as cached:
+            pickle.dump(key, cached, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump((record_columns, values), cached, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_file, self._get_cache_file(filename))
+
+    def parse(self, filename, columns=None):
+        """
+        Returns the rows of a tsv file from the cache, the file is parsed (and cached) if it was not cached or changed
+        since it was cached
+        :param filename: name of the file to parse
+        :param columns: the columns to return for each row, None to return all columns
+        :return: list of TsvRecords, the same as TsvToListConverter.parse
+        """
+        records = self._load(filename, columns)
+        if records is None:
+            file_hash = self._get_file_hash(filename)
+            records = TsvToListConverter.parse(filename, columns)
+            self._save(filename, columns, records, file_hash)
+        return records
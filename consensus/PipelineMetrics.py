@@ -0,0 +1,98 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # The resource module is only available on Unix
+    resource = None
+
+
+class PipelineMetrics:
+    """
+    The PipelineMetrics record the wall time, throughput and memory of each stage of the pipeline (and of each lab
+    during the retrieval), so the performance of exports can be compared. Stages and labs can be recorded from several
+    threads.
+    """
+
+    def __init__(self):
+        self.stages = []
+        self.labs = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_process_peak_rss():
+        """
+        Returns the peak resident set size of the process so far (the high-water mark since the process started, not
+        the peak of a single stage)
+        :return: the peak RSS in MB, None if it can't be measured on this platform
+        """
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+    @staticmethod
+    def _get_rows_per_second(rows, seconds):
+        return round(rows / seconds, 1) if rows is not None and seconds > 0 else None
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measures a stage of the pipeline, the number of rows the stage processed can be set on the yielded metrics:
+        with metrics.stage('consensus') as stage:
+            stage['rows'] = len(consensus)
+        A stage that raises an error is recorded as well, with failed set to True. allocated_blocks_delta is the number
+        of memory blocks that are allocated after the stage minus before it (the blocks the stage left allocated, not
+        the number of allocations).
+        :param name: the name of the stage
+        :return: dictionary with the metrics of the stage, completed when the stage is done
+        """
+        stage = {'stage': name, 'rows': None, 'failed': False}
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        try:
+            yield stage
+        except BaseException:
+            stage['failed'] = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            peak_rss = self.get_process_peak_rss()
+            # The peak RSS is the peak of the process up to the end of the stage, which may have been reached by an
+            # earlier stage
+            stage.update({'seconds': round(seconds, 3),
+                          'rows_per_second': self._get_rows_per_second(stage['rows'], seconds),
+                          'process_peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+                          'allocated_blocks_delta': sys.getallocatedblocks() - blocks})
+            with self._lock:
+                self.stages.append(stage)
+
+    def record_lab(self, lab, seconds, rows):
+        """
+        Records the retrieval (or, in the fused pipeline, the rewriting) of the data of a lab
+        :param lab: the id of the lab
+        :param seconds: the time it took to retrieve the data of the lab
+        :param rows: the number of variants of the lab
+        :return: None
+        """
+        with self._lock:
+            self.labs.append({'lab': lab, 'seconds': round(seconds, 3), 'rows': rows,
+                              'rows_per_second': self._get_rows_per_second(rows, seconds)})
+
+    def to_dict(self):
+        with self._lock:
+            return {'stages': list(self.stages), 'labs': list(self.labs)}
+
+    def save(self, file_name):
+        """
+        Writes the metrics to a JSON file
+        :param file_name: the path of the JSON file
+        :return: None
+        """
+        with open(file_name, 'w') as metrics_file:
+            json.dump(self.to_dict(), metrics_file, indent=2)
@@ -0,0 +1,92 @@
+import os
+from collections.abc import Mapping
+
+import numpy
+
+
+class SortedIndex(Mapping):
+    """
+    A SortedIndex is a read-only dictionary of strings that is kept on disk as a sorted array of keys (and an array with
+    the value of each key). The arrays are memory-mapped when the index is first used and keys are looked up with a
+    binary search, so only the pages of the files that are searched are read into memory.
+    """
+
+    def __init__(self, keys_file, values_file=None):
+        """
+        :param keys_file: the .npy file with the sorted keys
+        :param values_file: the .npy file with the values in the order of the keys (None if the index only has keys)
+        """
+        self.keys_file = keys_file
+        self.values_file = values_file
+        self._keys = None
+        self._values = None
+
+    @staticmethod
+    def save(keys_file, keys, values_file=None, values=None):
+        """
+        Sorts the keys (and their values) and writes them to the files of an index
+        :param keys_file: the .npy file to write the keys to
+        :param keys: a list of unique keys
+        :param values_file: the .npy file to write the values to (None if the index only has keys)
+        :param values: a list with the value of each key
+        :return: None
+        """
+        keys = numpy.array([key.encode('utf-8') for key in keys], dtype=bytes)
+        order = numpy.argsort(keys, kind='stable')
+        numpy.save(keys_file, keys[order])
+        if values_file:
+            values = numpy.array([value.encode('utf-8') for value in values], dtype=bytes)
+            numpy.save(values_file, values[order])
+
+    @staticmethod
+    def _load_array(file_name):
+        if file_name and os.path.isfile(file_name):
+            # A plain view of the memory-mapped array is searched faster than the memmap itself
+            return numpy.load(file_name, mmap_mode='r').view(numpy.ndarray)
+        return numpy.array([], dtype=bytes)
+
+    def _load(self):
+        """
+        Memory-maps the arrays of the index, the first time the index is used
+        :return: None
+        """
+        if self._keys is None:
+            self._keys = self._load_array(self.keys_file)
+            self._values = self._load_array(self.values_file)
+
+    def _find(self, key):
+        """
+        Looks up the position of a key with a binary search
+        :param key: the key to look up
+        :return: the position of the key in the keys, None if the index doesn't contain the key
+        """
+        self._load()
+        encoded = key.encode('utf-8')
+        # Keys that are longer than the longest key in the index would be truncated by the search
+        if len(self._keys) == 0 or len(encoded) > self._keys.dtype.itemsize:
+            return None
+        position = int(self._keys.searchsorted(encoded))
+        if position < len(self._keys) and self._keys[position] == encoded:
+            return position
+        return None
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self._find(key) is not None
+
+    def __getitem__(self, key):
+        position = self._find(key) if isinstance(key, str) else None
+        if position is None:
+            raise KeyError(key)
+        return self._values[position].decode('utf-8')
+
+    def __iter__(self):
+        self._load()
+        return (key.decode('utf-8') for key in self._keys)
+
+    def __len__(self):
+        self._load()
+        return len(self._keys)
+
+    def __getstate__(self):
+        # The memory-mapped arrays are mapped again after unpickling
+        return {'keys_file': self.keys_file, 'values_file': self.values_file, '_keys': None, '_values': None}
@@ -0,0 +1,36 @@
+from collections.abc import Mapping
+
+
+class TsvRecord(Mapping):
+    """
+    A TsvRecord is a compact, read-only row of a tsv file. The values of the row are stored in a tuple and the column
+    names are shared by all rows of the same file, so a row can be used like a dictionary without the overhead of one.
+    """
+    __slots__ = ('_columns', '_values')
+
+    def __init__(self, columns, values):
+        """
+        :param columns: dictionary with the column names as key and the position of their value as value (shared by all
+        rows of a file)
+        :param values: tuple with the values of the row
+        """
+        self._columns = columns
+        self._values = values
+
+    def __getitem__(self, column):
+        return self._values[self._columns[column]]
+
+    def __contains__(self, column):
+        return column in self._columns
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self)})'
+
+    def __reduce__(self):
+        return type(self), (self._columns, self._values)
@@ -1,27 +1,54 @@
+from consensus.TsvRecord import TsvRecord
+
+
 class TsvToListConverter:
     @staticmethod
     def _determine_columns_from_header(header):
         return {k: v for v, k in enumerate(header)}
 
     @staticmethod
-    def parse(filename):
+    def _select_columns(columns, selected_columns):
         """
-        Parses a tab separated file with headers and returns a list of dictionaries of the selected columns
+        Reduces the columns to the selected columns that are present in the header
+        :param columns: dictionary with the columns of the header as key and their position as value
+        :param selected_columns: the columns to keep, None to keep all columns
+        :return: dictionary with the selected columns as key and their position as value
+        """
+        if selected_columns is None:
+            return columns
+        return {column: columns[column] for column in selected_columns if column in columns}
+
+    @staticmethod
+    def iterate(filename, columns=None):
+        """
+        Streams a tab separated file with headers, one row at a time, so the file is never completely in memory
         :param filename: name of the file to parse
-        :return: list of dictionaries with the columns as key and the value from that column as value
+        :param columns: the columns to return for each row, None to return all columns (columns that are not in the
+        header are skipped)
+        :return: generator of TsvRecords (read-only dictionaries) with the columns as key and the value from that column
+        as value
         """
-        converted_list = []
-        columns = {}
         with open(filename) as f:
-            for i, line in enumerate(f.readlines()):
+            header = f.readline().strip('\n').replace('"', '').split('\t')
+            selected = TsvToListConverter._select_columns(
+                TsvToListConverter._determine_columns_from_header(header), columns)
+            # All rows share the same column positions, the values of a row are stored in the order of the selection
+            record_columns = {column: position for position, column in enumerate(selected)}
+            positions = list(selected.values())
+            for line in f:
                 data = line.strip('\n').replace('"', '').split('\t')
-                if i == 0:
-                    columns = TsvToListConverter._determine_columns_from_header(data)
-                else:
-                    converted_list.append(
-                        {column: data[columns[column]] for column in columns}
-                    )
-        return converted_list
+                yield TsvRecord(record_columns, tuple([data[position] for position in positions]))
+
+    @staticmethod
+    def parse(filename, columns=None):
+        """
+        Parses a tab separated file with headers and returns a list of dictionaries of the selected columns
+        :param filename: name of the file to parse
+        :param columns: the columns to return for each row, None to return all columns
+        :return: list of TsvRecords (read-only dictionaries) with the columns as key and the value from that column as
+        value
+        """
+        return list(TsvToListConverter.iterate(filename, columns))
 
 
 def main():
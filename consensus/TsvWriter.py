@@ -0,0 +1,59 @@
+import shutil
+
+
+class TsvWriter:
+    """The TsvWriter writes rows (lists of fields) to a tab separated file and writes the rows in bulk"""
+
+    def __init__(self, file_name, buffer_size=1000, mode='w'):
+        """
+        :param file_name: the name of the file to write to
+        :param buffer_size: the number of rows to collect before they are written to the file
+        :param mode: the mode to open the file with ('w' to overwrite the file, 'a' to append to it)
+        """
+        self.file_name = file_name
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.file = open(file_name, mode)
+
+    def write_row(self, fields):
+        """
+        Adds a row to the buffer and writes the buffer to the file if it is full
+        :param fields: the values of the columns of the row
+        :return: None
+        """
+        self.buffer.append('\t'.join(map(str, fields)) + '\n')
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def append_file(self, file_name):
+        """
+        Copies the content of another file (for instance a part of the same table written by another process) after
+        the rows that were written so far
+        :param file_name: the name of the file to copy
+        :return: None
+        """
+        self.flush()
+        with open(file_name) as part:
+            shutil.copyfileobj(part, self.file)
+
+    def flush(self):
+        """
+        Writes the buffered rows to the file
+        :return: None
+        """
+        self.file.writelines(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        """
+        Writes the buffered rows and closes the file
+        :return: None
+        """
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+
+
+class UploadProgress:
+    """
+    The UploadProgress keeps track of the steps and batches of an upload that are done in a JSON file, so an upload
+    that was interrupted can be resumed where it stopped. An upload can only be resumed if the files and the batch size
+    didn't change, see get_changed_tables.
+    """
+
+    def __init__(self, file_name=None):
+        """
+        :param file_name: the JSON file to keep the progress in (None to only keep the progress in memory)
+        """
+        self.file_name = file_name
+        self.progress = {'steps': [], 'tables': {}}
+        self._lock = threading.Lock()
+        if self.file_name and os.path.isfile(self.file_name):
+            with open(self.file_name) as progress_file:
+                self.progress = json.load(progress_file)
+
+    @staticmethod
+    def get_file_key(file_name, batch_size):
+        """
+        Identifies the content of a file and how it is split in batches
+        :param file_name: the path of the file
+        :param batch_size: the number of rows per batch
+        :return: dictionary with the path, size and modification time of the file and the batch size
+        """
+        stat = os.stat(file_name)
+        return {'file': os.path.abspath(file_name), 'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+                'batch_size': batch_size}
+
+    def _save(self):
+        if not self.file_name:
+            return
+        # Write to a temporary file first, so an interrupted run doesn't leave a broken progress file behind
+        temporary_file = self.file_name + '.tmp'
+        with open(temporary_file, 'w') as progress_file:
+            json.dump(self.progress, progress_file)
+        os.replace(temporary_file, self.file_name)
+
+    def is_done(self, step):
+        with self._lock:
+            return step in self.progress['steps']
+
+    def mark_done(self, step):
+        """
+        Records that a step of the upload (deleting or importing a table) is done
+        :param step: the name of the step (import vkgl_consensus)
+        :return: None
+        """
+        with self._lock:
+            self.progress['steps'].append(step)
+            self._save()
+
+    def get_changed_tables(self, file_keys):
+        """
+        Returns the tables of which (a part of) a file was uploaded that changed since. The rows of those files are
+        already in MOLGENIS, and tables that refer to them may have been imported already, so the upload can't be
+        resumed.
+        :param file_keys: dictionary with the key of the file of each table (see get_file_key)
+        :return: list with the ids of the changed tables
+        """
+        with self._lock:
+            return [table for table, table_progress in self.progress['tables'].items() if
+                    table_progress['key'] != file_keys.get(table)]
+
+    def is_started(self, table):
+        with self._lock:
+            return table in self.progress['tables']
+
+    def get_batches(self, table, file_key):
+        """
+        Returns the batches of a table that were uploaded from the same file before
+        :param table: the id of the table
+        :param file_key: the key of the file that is uploaded (see get_file_key)
+        :return: set with the numbers of the uploaded batches
+        """
+        with self._lock:
+            table_progress = self.progress['tables'].setdefault(table, {'key': file_key, 'batches': []})
+            if table_progress['key'] != file_key:
+                raise ValueError(f'The file of {table} changed since it was uploaded')
+            return set(table_progress['batches'])
+
+    def add_batch(self, table, batch):
+        """
+        Records that a batch of a table was uploaded
+        :param table: the id of the table
+        :param batch: the number of the batch
+        :return: None
+        """
+        with self._lock:
+            self.progress['tables'][table]['batches'].append(batch)
+            self._save()
+
+    def clear(self):
+        """
+        Removes the progress once the upload is done, so the next upload starts from the beginning
+        :return: None
+        """
+        with self._lock:
+            self.progress = {'steps': [], 'tables': {}}
+            if self.file_name and os.path.isfile(self.file_name):
+                os.remove(self.file_name)
@@ -1,9 +1,30 @@
+from functools import lru_cache
+
+import numpy
+import pandas
+
+
 class Variants:
+    # Maximum number of distinct ref/alt pairs of which the type and simplification are remembered
+    cache_size = 2 ** 16
+
     @staticmethod
     def need_simplification(ref, alt):
         return len(ref) > 0 and len(alt) > 0 and ref[0] == alt[0]
 
     @staticmethod
+    def need_simplifications(refs, alts):
+        """
+        Vectorized version of need_simplification
+        :param refs: Series with the reference sequences
+        :param alts: Series with the alternative sequences (same index as refs)
+        :return: Series with for each ref and alt if they need simplification
+        """
+        # The first character of an empty sequence is missing, which is never equal to another character
+        return refs.str[0] == alts.str[0]
+
+    @staticmethod
+    @lru_cache(maxsize=cache_size)
     def get_variant_type(raw_ref, raw_alt):
         ref, alt = Variants._simplify_ref_alt(raw_ref, raw_alt)
 
@@ -19,17 +40,37 @@ class Variants:
         return variant_type
 
     @staticmethod
-    def _strip_matching_seq_start(ref, alt):
+    def get_variant_types(refs, alts):
+        """
+        Vectorized version of get_variant_type
+        :param refs: Series with the reference sequences
+        :param alts: Series with the alternative sequences (same index as refs)
+        :return: Series with the type of each variant
         """
-        This functions strips the matching starts of the ref and alt (for instance: CTGGTG>CTGGCG becomes TG>CG)
+        refs, alts = Variants.simplify_ref_alts(refs, alts)
+        conditions = [refs == '.', alts == '.', (refs.str.len() == 1) & (alts.str.len() == 1)]
+        variant_types = numpy.select(conditions, ['ins', 'del', 'snp'], default='delins').astype(object)
+        return pandas.Series(variant_types, index=refs.index, dtype=object)
+
+    @staticmethod
+    def _get_matching_lengths(ref, alt):
+        """
+        Determines in a single pass over the ref and alt how long their matching start is and how long the matching
+        stop of the remaining sequences is (for instance: CTGGTG>CTGGCG has a matching start of 4 and a matching stop of
+        1)
         :param ref: the reference sequence
         :param alt: the alternative sequence
-        :return: the ref and alt without their matching start
+        :return: tuple with the length of the matching start and the length of the matching stop
         """
-        while Variants.need_simplification(ref, alt):
-            ref = ref[1::]
-            alt = alt[1::]
-        return ref, alt
+        shortest = min(len(ref), len(alt))
+        start = 0
+        while start < shortest and ref[start] == alt[start]:
+            start += 1
+        stop = 0
+        # The matching stop can't overlap the matching start
+        while stop < shortest - start and ref[-1 - stop] == alt[-1 - stop]:
+            stop += 1
+        return start, stop
 
     @staticmethod
     def _get_actual_ref_and_alt(ref, alt):
@@ -39,22 +80,11 @@ class Variants:
         :param alt: the alternative sequence
         :return: the ref and alt without their matching start and stop
         """
-        # Check if the first character is the same
-        if ref[0] == alt[0]:
-            # Remove the matching start
-            ref, alt = Variants._strip_matching_seq_start(ref, alt)
-
-        # Check if the last character is the same
-        if len(ref) > 0 and len(alt) > 0 and ref[-1] == alt[-1]:
-            # Pass the reversed sequence to the strip start to remove the matching start of it (== end of the sequence)
-            r_ref, r_alt = Variants._strip_matching_seq_start(ref[::-1], alt[::-1])
-            # Turn the sequences around again
-            ref = r_ref[::-1]
-            alt = r_alt[::-1]
-
-        return ref, alt
+        start, stop = Variants._get_matching_lengths(ref, alt)
+        return ref[start:len(ref) - stop], alt[start:len(alt) - stop]
 
     @staticmethod
+    @lru_cache(maxsize=cache_size)
     def _simplify_ref_alt(raw_ref, raw_alt):
         """
         Writes the ref and alt as short as possible (duplicate ending and beginning are removed, and if none left
@@ -63,11 +93,47 @@ class Variants:
         :param raw_alt: the potentially long alt
         :return: tuple with short ref and alt
         """
-        # If ref and alt are same length, stripping function won't work
-        # Skip ref/alt for which length == 1, for performance
         ref, alt = Variants._get_actual_ref_and_alt(raw_ref, raw_alt)
         if len(ref) == 0:
             ref = '.'
         elif len(alt) == 0:
             alt = '.'
         return ref, alt
+
+    @staticmethod
+    def simplify_ref_alts(refs, alts):
+        """
+        Vectorized version of _simplify_ref_alt, only the variants that have a matching start or stop (or an empty ref
+        or alt) are simplified one by one
+        :param refs: Series with the potentially long refs
+        :param alts: Series with the potentially long alts (same index as refs)
+        :return: tuple with a Series with the short refs and a Series with the short alts
+        """
+        simplify = (refs.str[0] == alts.str[0]) | (refs.str[-1] == alts.str[-1]) | (refs.str.len() == 0) | \
+                   (alts.str.len() == 0)
+        refs = refs.astype(object)
+        alts = alts.astype(object)
+        if simplify.any():
+            simplified = [Variants._simplify_ref_alt(ref, alt) for ref, alt in zip(refs[simplify], alts[simplify])]
+            simplified_refs, simplified_alts = zip(*simplified)
+            refs[simplify] = simplified_refs
+            alts[simplify] = simplified_alts
+        return refs, alts
+
+    @staticmethod
+    def get_cache_info():
+        """
+        Returns the hits, misses and size of the caches of the variant type and simplification
+        :return: dictionary with the name of the cached function as key and its CacheInfo as value
+        """
+        return {'get_variant_type': Variants.get_variant_type.cache_info(),
+                'simplify_ref_alt': Variants._simplify_ref_alt.cache_info()}
+
+    @staticmethod
+    def clear_caches():
+        """
+        Empties the caches of the variant type and simplification and resets their counters
+        :return: None
+        """
+        Variants.get_variant_type.cache_clear()
+        Variants._simplify_ref_alt.cache_clear()
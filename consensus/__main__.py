@@ -1,11 +1,20 @@
+import time
+
 from termcolor import colored
 
 from consensus.DataRetriever import DataRetriever
 from consensus.ConsensusTableGenerator import ConsensusTableGenerator
+from consensus.ColumnarConsensusTableGenerator import ColumnarConsensusTableGenerator
 from consensus.MolgenisConfigParser import MolgenisConfigParser as ConfigParser
+from consensus.HashCache import HashCache
 from consensus.HistorySorter import HistorySorter
+from consensus.HistoryPartitions import HistoryPartitions
+from consensus.HistoryStore import HistoryStore
+from consensus.LabFileRewriter import LabFileRewriter
 from consensus.ConsensusReporter import ConsensusReporter
 from consensus.ConsensusFileGenerator import ConsensusFileGenerator
+from consensus.ConsensusSnapshot import ConsensusSnapshot
+from consensus.PipelineMetrics import PipelineMetrics
 
 
 def main(config_file):
@@ -13,44 +22,108 @@ def main(config_file):
     config = ConfigParser(config_file)
     consensus_table = config.prefix + config.consensus
     comments_table = config.prefix + config.comments
-    history_file = f'{config.input}{config.prefix}{config.history}.tsv'
+    history_file = HistoryPartitions.get_history(config.input, config.prefix, config.history)
     previous_exports = config.previous
     if type(previous_exports) != list:
         previous_exports = [previous_exports]
     output = config.output
     labs = config.labs
+    # Record the time, throughput and memory of each stage
+    metrics = PipelineMetrics()
 
     # Retrieve data
-    retriever = DataRetriever(labs, config.prefix, history_file, config.output)
-    retriever.retrieve_all_data()
+    # Incremental processing iterates the lab data twice, so it can't be streamed
+    streaming = config.streaming and not config.snapshot
+    # The history store reads the history itself, only when it needs to be built
+    # The fused pipeline reads the raw lab files itself, instead of the preprocessed lab files
+    with metrics.stage('retrieval') as stage:
+        retriever = DataRetriever([] if config.fused else labs, config.prefix,
+                                  None if config.history_store else history_file, config.output, streaming=streaming,
+                                  lab_columns=ConsensusTableGenerator.lab_columns,
+                                  history_columns=HistorySorter.history_columns, workers=config.workers,
+                                  cache=config.cache, previous_exports=previous_exports, metrics=metrics)
+        retriever.retrieve_all_data()
+        if not streaming:
+            stage['rows'] = sum(len(lab_data) for lab_data in retriever.all_lab_data.values()) + len(retriever.history)
     lab_data = retriever.all_lab_data
+    comments = None
+    if config.fused:
+        # Preprocess the raw lab files while they are read, the lab files and comments are written as a side output
+        with metrics.stage('rewriting') as stage:
+            comments = LabFileRewriter.create_comments_file(f'{output}{config.prefix}comments.tsv')
+            lab_data = {lab: LabFileRewriter(lab, f'{config.input}{config.prefix}{lab}.tsv',
+                                             f'{output}{config.prefix}{lab}.tsv', comments).iterate(
+                ConsensusTableGenerator.lab_columns) for lab in labs}
+            if not streaming:
+                # The labs are read one by one, so the comments stay in the order of the labs
+                for lab in labs:
+                    start = time.perf_counter()
+                    lab_data[lab] = list(lab_data[lab])
+                    metrics.record_lab(lab, time.perf_counter() - start, len(lab_data[lab]))
+                stage['rows'] = sum(len(lab_variants) for lab_variants in lab_data.values())
+            # When streaming, the lab files are read and rewritten while the consensus is generated
 
-    # Sort history on export
-    history = retriever.history
-    history_sorter = HistorySorter(history, previous_exports)
-    sorted_history = history_sorter.sorted_history
-    alternative_history = history_sorter.alternative_history
+    with metrics.stage('history') as stage:
+        if config.history_store:
+            # Look up the history on disk, the store is only built again for the exports of which the history changed
+            history_store = HistoryStore.update(config.history_store, history_file, previous_exports,
+                                                HistorySorter.history_columns)
+            history_index = history_store
+            alternative_history = history_store.alternative_history
+        else:
+            # Sort history on export
+            history = retriever.history
+            history_sorter = HistorySorter(history, previous_exports)
+            history_index = history_sorter.history_index
+            alternative_history = history_sorter.alternative_history
+            stage['rows'] = len(history_index)
 
     # Generate consensus table in memory
-    consensus_generator = ConsensusTableGenerator(lab_data)
-    consensus = consensus_generator.process_variants()
+    with metrics.stage('consensus') as stage:
+        if config.snapshot:
+            # Only process the variants that changed since the previous export
+            consensus_generator = ConsensusTableGenerator(lab_data)
+            snapshot = ConsensusSnapshot.load(config.snapshot, labs)
+            consensus = consensus_generator.process_variants_incrementally(snapshot)
+            consensus_generator.create_snapshot().save(config.snapshot)
+        elif config.engine == 'columnar':
+            consensus = ColumnarConsensusTableGenerator(lab_data).process_variants()
+        else:
+            consensus = ConsensusTableGenerator(lab_data).process_variants()
+        if comments:
+            # All lab files are rewritten once the consensus is generated
+            comments.close()
+        stage['rows'] = len(consensus)
 
     # Generate and upload TSV with consensus table
-    file_generator = ConsensusFileGenerator(
-        data={'consensus': consensus, 'history': {'history': sorted_history, 'alternative': alternative_history}},
-        tables={'consensus_table': output + consensus_table, 'comments_table': output + comments_table},
-        labs= labs,
-        incorrect_variant_history_file=output + 'incorrect_variant_history.tsv'
-    )
-    file_generator.generate_consensus_files()
+    with metrics.stage('files') as stage:
+        hash_cache = HashCache(config.hash_cache)
+        file_generator = ConsensusFileGenerator(
+            data={'consensus': consensus,
+                  'history': {'history': history_index, 'alternative': alternative_history,
+                              'exports': previous_exports}},
+            tables={'consensus_table': output + consensus_table, 'comments_table': output + comments_table},
+            labs= labs,
+            incorrect_variant_history_file=output + 'incorrect_variant_history.tsv',
+            hash_cache=hash_cache,
+            workers=config.workers
+        )
+        file_generator.generate_consensus_files()
+        hash_cache.save()
+        stage['rows'] = len(consensus)
 
     # Generate reports
-    prefix = config.prefix
-    tsv = '{}/{}consensus.tsv'.format(output, prefix)
-    public = prefix + 'public_consensus'
-    ConsensusReporter(tsv, config.labs, public, prefix, output).process_consensus()
+    with metrics.stage('reports') as stage:
+        prefix = config.prefix
+        public = prefix + 'public_consensus'
+        # The consensus is still in memory, so the reporter doesn't need to read the consensus tsv again
+        ConsensusReporter.from_consensus(consensus, config.labs, public, prefix, output,
+                                         workers=config.report_workers).process_consensus()
+        stage['rows'] = len(consensus)
     print('Added incorrect variants in history to [{}]'.format(
         colored('{}incorrect_variant_history.tsv'.format(output), 'blue')))
+    metrics.save(output + 'pipeline_metrics.json')
+    print('Written pipeline metrics to [{}]'.format(colored('{}pipeline_metrics.json'.format(output), 'blue')))
 
 
 if __name__ == '__main__':
@@ -1,13 +1,32 @@
 import datetime
+import os
+import shutil
+
+from consensus.HistoryPartitions import HistoryPartitions
 from consensus.MolgenisConfigParser import MolgenisConfigParser as ConfigParser
+from consensus.TsvWriter import TsvWriter
 
 
 class HistoryWriter:
-    def __init__(self, yymm, consensus_file, comments_file, history_file):
+    def __init__(self, yymm, consensus_file, comments_file, history_file, append=False):
+        """
+        :param yymm: the id of the export (format: yymm, 1810 is october 2018)
+        :param consensus_file: the consensus file of the export
+        :param comments_file: the consensus comments file of the export
+        :param history_file: the history file to write the export to, or the history folder to write the partition of
+        the export to
+        :param append: if True, the export is added to the end of an existing history file, instead of overwriting it
+        """
         print('We are writing history here!')
         self.yymm = yymm
+        # The export is the same for all rows
+        self.export_moment = self._get_export_moment()
         self.comments = self.parse_comments_file(comments_file)
-        self.parse_consensus_file(consensus_file, history_file)
+        if HistoryPartitions.is_partitioned(history_file):
+            # Only the partition of this export is (re)written
+            self.parse_consensus_file(consensus_file, HistoryPartitions.get_partition(history_file, yymm))
+        else:
+            self.parse_consensus_file(consensus_file, history_file, append)
 
     @staticmethod
     def parse_comments_file(comments_file):
@@ -31,14 +50,65 @@ class HistoryWriter:
         yymm = str(self.yymm)
         year = f'20{yymm[0:2]}'
         month = datetime.date(1900, int(yymm[2:4]), 1).strftime('%B')
-        return f'{month} {year}\n'
+        return f'{month} {year}'
+
+    @staticmethod
+    def _get_existing_header(history_file_name):
+        """
+        Reads the header of an existing history file and makes sure the file ends with a newline, so rows can be
+        appended to it
+        :param history_file_name: the path of the history file
+        :return: the columns of the history file, None if the file doesn't exist or is empty
+        """
+        if not os.path.isfile(history_file_name) or os.path.getsize(history_file_name) == 0:
+            return None
+        with open(history_file_name) as history_file:
+            header = history_file.readline().strip('\n').replace('"', '').split('\t')
+        with open(history_file_name, 'rb+') as history_file:
+            history_file.seek(-1, os.SEEK_END)
+            if history_file.read(1) != b'\n':
+                history_file.write(b'\n')
+        return header
+
+    @staticmethod
+    def partition_history(history_file, history_folder):
+        """
+        Splits a history file with all exports into a partition per export
+        :param history_file: the history file to split
+        :param history_folder: the folder to write the partitions to
+        :return: None
+        """
+        os.makedirs(history_folder, exist_ok=True)
+        partitions = {}
+        with open(history_file) as history:
+            header = history.readline().strip('\n').split('\t')
+            id_pos = [column.replace('"', '') for column in header].index('id')
+            for line in history:
+                line = line.strip('\n').split('\t')
+                export = line[id_pos].replace('"', '').split('_')[0]
+                if export not in partitions:
+                    partitions[export] = TsvWriter(HistoryPartitions.get_partition(history_folder, export))
+                    partitions[export].write_row(header)
+                partitions[export].write_row(line)
+        for partition in partitions.values():
+            partition.close()
 
-    def parse_consensus_file(self, consensus_file, history_file_name):
+    def parse_consensus_file(self, consensus_file, history_file_name, append=False):
+        """
+        Writes the rows of the consensus file to the history file while the consensus file is read
+        :param consensus_file: the consensus file of the export
+        :param history_file_name: the history file to write the export to
+        :param append: if True, the rows are added to the end of an existing history file, in the order of its columns
+        :return: None
+        """
+        existing_header = self._get_existing_header(history_file_name) if append else None
         opened_file = open(consensus_file)
+        history_file = TsvWriter(history_file_name, mode='a' if existing_header else 'w')
         id_pos = 0
         remove_pos = []
         comments_pos = 0
-        history_file_content = ''
+        # Positions of the history columns in the rows of the consensus file, in the order of the history file
+        positions = None
 
         for i, line in enumerate(opened_file):
             line = line.strip('\n').replace('"', '').split('\t')
@@ -47,9 +117,15 @@ class HistoryWriter:
                 comments_pos = line.index('comments')
                 remove_pos = [line.index(link) for link in line if self._remove_column(link)]
                 headers = [column for column in line if not self._remove_column(column)]
-                headers.append('export\n')
-                history_file_content += '\t'.join(headers)
+                headers.append('export')
+                number_of_columns = len(line)
+                if existing_header:
+                    positions = [headers.index(column) if column in headers else None for column in existing_header]
+                else:
+                    history_file.write_row(headers)
             else:
+                # Empty columns at the end of the row may be missing
+                line += [''] * (number_of_columns - len(line))
                 # move comments value to comments column
                 line[comments_pos] = self.comments[line[id_pos]]
                 # rename id
@@ -58,11 +134,11 @@ class HistoryWriter:
                 for link_idx in remove_pos[::-1]:
                     del line[link_idx]
                 # add export column
-                line.append(self._get_export_moment())
-                history_file_content += '\t'.join(line)
+                line.append(self.export_moment)
+                if positions:
+                    line = [line[position] if position is not None else '' for position in positions]
+                history_file.write_row(line)
 
-        history_file = open(history_file_name, 'w')
-        history_file.write(history_file_content)
         history_file.close()
         opened_file.close()
 
@@ -72,9 +148,13 @@ def main():
     input_folder = config.input
     output_folder = config.output
     previous = config.previous[-1]
+    history_file = output_folder + '/vkgl_consensus_history.tsv'
     HistoryWriter(previous, input_folder + 'vkgl_consensus20{}.tsv'.format(previous),
-                            input_folder + 'vkgl_consensus_comments20{}.tsv'.format(previous),
-                            output_folder + '/vkgl_consensus_history.tsv')
+                            input_folder + 'vkgl_consensus_comments20{}.tsv'.format(previous), history_file)
+    history = HistoryPartitions.get_history(input_folder, config.prefix, config.history)
+    if HistoryPartitions.is_partitioned(history):
+        # The history file in the output is imported in MOLGENIS, the partition is read by the next consensus run
+        shutil.copyfile(history_file, HistoryPartitions.get_partition(history, previous))
 
 
 if __name__ == '__main__':
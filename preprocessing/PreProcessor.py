@@ -1,59 +1,76 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from consensus.LabFileRewriter import LabFileRewriter
 from consensus.MolgenisConfigParser import MolgenisConfigParser as ConfigParser
+from consensus.TsvWriter import TsvWriter
 
 
 class PreProcessor:
-    def __init__(self, lab_files, labs, comments_file, input_dir, output_dir):
+    def __init__(self, lab_files, labs, comments_file, input_dir, output_dir, workers=None):
+        """
+        :param lab_files: the names of the raw lab files in the input dir
+        :param labs: the ids of the labs (in the order of the lab files)
+        :param comments_file: the name of the comments file to write to the output dir
+        :param input_dir: the folder with the raw lab files
+        :param output_dir: the folder to write the processed lab files and the comments file to
+        :param workers: the number of worker processes to process the labs with (None to process them one by one)
+        """
         self.output_dir = output_dir
         self.input_dir = input_dir
-        self.comments_file = self.create_comments_file(comments_file)
-        for lab_file, lab in zip(lab_files, labs):
-            self.process_file(lab_file, lab)
+        if workers:
+            self.process_files_in_parallel(lab_files, labs, comments_file, workers)
+        else:
+            with self.create_comments_file(comments_file) as comments:
+                for lab_file, lab in zip(lab_files, labs):
+                    self.process_file(lab_file, lab, comments)
 
-        self.comments_file.close()
+    def create_comments_file(self, name):
+        return LabFileRewriter.create_comments_file(self.output_dir + name)
 
-    @staticmethod
-    def _get_id(variant_id, lab):
-        prefix = lab.upper().replace('_', '') + '_'
-        # Get first 10 of hash
-        return prefix + variant_id[0:10]
+    def process_file(self, file_to_process, lab, comments):
+        """
+        Writes the lab file with the lab specific ids to the output dir and adds the ids to the comments
+        :param file_to_process: the name of the raw lab file in the input dir
+        :param lab: the id of the lab
+        :param comments: the TsvWriter of the comments file
+        :return: None
+        """
+        LabFileRewriter(lab, self.input_dir + file_to_process, '{}vkgl_{}.tsv'.format(self.output_dir, lab),
+                        comments).rewrite()
 
-    @staticmethod
-    def _create_comment_line(comment_id):
-        return '"{}"\t"-"\n'.format(comment_id)
+    def _process_file_to_shard(self, file_to_process, lab, shard):
+        """
+        Processes a lab file in a worker process, the comments of the lab are written to a separate shard
+        :param file_to_process: the name of the raw lab file in the input dir
+        :param lab: the id of the lab
+        :param shard: the path of the comments shard of the lab
+        :return: the path of the comments shard
+        """
+        with TsvWriter(shard) as comments:
+            self.process_file(file_to_process, lab, comments)
+        return shard
 
-    def create_comments_file(self, name):
-        file_path = self.output_dir + name
-        output_file = open(file_path, 'w')
-        header = '"id"\t"comments"\n'
-        output_file.write(header)
-        return output_file
+    def process_files_in_parallel(self, lab_files, labs, comments_file, workers):
+        """
+        Processes each lab file in a worker process and concatenates the comments shards of the labs in the order of
+        the labs, so the comments file is the same as when the labs are processed one by one
+        :param lab_files: the names of the raw lab files in the input dir
+        :param labs: the ids of the labs (in the order of the lab files)
+        :param comments_file: the name of the comments file to write to the output dir
+        :param workers: the number of worker processes
+        :return: None
+        """
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shards = [executor.submit(self._process_file_to_shard, lab_file, lab,
+                                      '{}{}.{}.part'.format(self.output_dir, comments_file, lab))
+                      for lab_file, lab in zip(lab_files, labs)]
+            shards = [shard.result() for shard in shards]
 
-    def process_file(self, file_to_process, lab):
-        input_file = open(self.input_dir + file_to_process)
-        lab_output_file = open('{}vkgl_{}.tsv'.format(self.output_dir, lab), 'w')
-        id_pos = 0
-        comments_idx = 0
-        for i, line in enumerate(input_file):
-            line = line.strip('\n').split('\t')
-            if i == 0:
-                id_pos = line.index('id')
-                comments_idx = line.index('comments')
-                del line[comments_idx]
-                del line[id_pos]
-                line.append('comments\tid\n')
-                lab_output_file.write('\t'.join(line))
-            else:
-                variant_id = line[id_pos]
-                lab_variant_id = self._get_id(variant_id, lab)
-                del line[comments_idx]
-                del line[id_pos]
-                # Append it twice, once for comment, once for id
-                line.append(lab_variant_id)
-                line.append(lab_variant_id)
-                lab_output_file.write('\t'.join(line) + '\n')
-                self.comments_file.write(self._create_comment_line(lab_variant_id))
-        input_file.close()
-        lab_output_file.close()
+        with self.create_comments_file(comments_file) as comments:
+            for shard in shards:
+                comments.append_file(shard)
+                os.remove(shard)
 
 
 def main(config_file):
@@ -63,7 +80,7 @@ def main(config_file):
     labs = config.labs
     prefix = config.prefix
     lab_files = [prefix + lab + '.tsv' for lab in labs]
-    PreProcessor(lab_files, labs, "vkgl_comments.tsv", input_folder, output_folder)
+    PreProcessor(lab_files, labs, "vkgl_comments.tsv", input_folder, output_folder, workers=config.workers)
 
 
 if __name__ == '__main__':
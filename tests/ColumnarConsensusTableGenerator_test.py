@@ -0,0 +1,63 @@
+import os
+import unittest
+
+from parameterized import parameterized
+
+from consensus.ColumnarConsensusTableGenerator import ColumnarConsensusTableGenerator
+from consensus.ConsensusTableGenerator import ConsensusTableGenerator
+from consensus.TsvToListConverter import TsvToListConverter
+
+
+class TestColumnarConsensusTableGenerator(unittest.TestCase):
+    variant = {'id': '', 'chromosome': '11', 'start': '108098576', 'stop': '108098576', 'ref': 'C', 'alt': 'G',
+               'gene': 'ATM', 'type': 'sub', 'c_dna': 'c.146C>G', 'transcript': 'NM_000051.3',
+               'classification': ''}
+
+    def _get_lab_data(self, classifications):
+        return {f'lab{i}': [dict(self.variant, id=f'LAB{i}_abc', classification=classification)] for
+                i, classification in enumerate(classifications)}
+
+    @parameterized.expand([
+        ('one_lab', ['lp'], 'Classified by one lab'),
+        ('benign', ['b', 'lb'], '(Likely) benign'),
+        ('pathogenic', ['lp', 'p', 'p'], '(Likely) pathogenic'),
+        ('vus', ['vus', 'vus'], 'VUS'),
+        ('no_consensus', ['vus', 'lb'], 'No consensus'),
+        ('opposite', ['vus', 'b', 'p'], 'Opposite classifications')
+    ])
+    def test_process_variants(self, _, classifications, expected_classification):
+        lab_data = self._get_lab_data(classifications)
+        expected = ConsensusTableGenerator(lab_data).process_variants()
+        observed = ColumnarConsensusTableGenerator(lab_data).process_variants()
+        self.assertEqual(expected, observed)
+        self.assertEqual(expected_classification, observed['abc']['consensus']['consensus_classification'])
+
+    def test_process_variants_stop_and_missing_columns(self):
+        lab0 = dict(self.variant, id='LAB0_abc', classification='b', stop='0')
+        del lab0['c_dna']
+        lab1 = dict(self.variant, id='LAB1_abc', classification='b', c_dna='c.1A>G', stop='5')
+        lab_data = {'lab0': [lab0], 'lab1': [lab1]}
+        observed = ColumnarConsensusTableGenerator(lab_data).process_variants()
+        self.assertEqual(ConsensusTableGenerator(lab_data).process_variants(), observed)
+        self.assertEqual('c.1A>G', observed['abc']['consensus']['c_dna'])
+        self.assertEqual('5', observed['abc']['consensus']['stop'])
+
+    def test_process_variants_test_data(self):
+        labs = ['lumc', 'amc', 'nki', 'vumc', 'umcg', 'umcu', 'radboud_mumc', 'erasmus']
+        lab_data = {lab: TsvToListConverter.parse('test_data{}input{}vkgl_{}.tsv'.format(os.sep, os.sep, lab),
+                                                  ConsensusTableGenerator.lab_columns) for lab in labs}
+        table_generator = ConsensusTableGenerator(lab_data)
+        expected = table_generator.process_variants()
+        columnar_generator = ColumnarConsensusTableGenerator(lab_data)
+        observed = columnar_generator.process_variants()
+        self.assertEqual(expected, observed)
+        self.assertEqual(list(expected), list(observed))
+        self.assertEqual(table_generator.all_classifications, columnar_generator.all_classifications)
+
+    def test_process_variants_unknown_classification(self):
+        with self.assertRaises(KeyError):
+            ColumnarConsensusTableGenerator(self._get_lab_data(['b', 'x'])).process_variants()
+
+
+if __name__ == '__main__':
+    unittest.main()
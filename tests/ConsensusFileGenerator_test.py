@@ -1,5 +1,9 @@
+import os
+import tempfile
 from unittest import TestCase
 
+import mock
+
 from parameterized import parameterized
 
 from consensus.ConsensusFileGenerator import ConsensusFileGenerator
@@ -10,29 +14,40 @@ class ConsensusFileGeneratorTest(TestCase):
         data={'consensus': {},
               'history': {
                   'history': {
-                      '1912': ['1912_00299bb101', '1912_001759607f',
-                               '1912_f2941cd0ea']},
+                      '00299bb101': {'1912': {''}},
+                      '001759607f': {'1912': {''}},
+                      'f2941cd0ea': {'1912': {''}}},
                   'alternative': {
                       '1912': {
                           'ATP1A2_NM_000702.2:c.2841-20_2841-19insC': '1912_f2941cd0ea',
                           'PALB2_NM_024675.3:c.2928G>T': '1912_00299bb101'}
-                  }}
+                  },
+                  'exports': ['1912']}
               },
         tables={'consensus_table': '', 'comments_table': ''}, labs=[])
 
     def test__get_lab_classification(self):
         variant_classifications = {"LAB1": "b", "LAB2": "v", "LAB3": ""}
-        variant = {"chromosome": "11", "start": "108167858", "ref": "T", "alt": "A", "gene": "ATM"}
 
-        expected_string = '\tLAB1_4d11f6c3b0\tBenign'
+        expected_fields = ['LAB1_4d11f6c3b0', 'Benign']
         expected_bool = True
 
-        observed_string, observed_bool = ConsensusFileGenerator._get_lab_classification(variant_classifications, 'LAB1',
-                                                                                        variant)
+        observed_fields, observed_bool = ConsensusFileGenerator._get_lab_classification(variant_classifications, 'LAB1',
+                                                                                        '4d11f6c3b0')
 
-        self.assertEqual(expected_string, observed_string)
+        self.assertEqual(expected_fields, observed_fields)
         self.assertEqual(expected_bool, observed_bool)
 
+    def test__get_lab_classification_not_classified(self):
+        variant_classifications = {"LAB1": "b", "LAB2": "v", "LAB3": ""}
+        observed = ConsensusFileGenerator._get_lab_classification(variant_classifications, 'LAB3', '4d11f6c3b0')
+        self.assertEqual((['', ''], False), observed)
+
+    def test__get_hashed_variant(self):
+        variant = {"chromosome": "11", "start": 108167858, "ref": "T", "alt": "A", "gene": "ATM"}
+        self.assertEqual('4d11f6c3b0', self.file_generator._get_hashed_variant(variant))
+        self.assertIn('11_108167858_T_A_ATM', self.file_generator.hash_cache.hashes)
+
     def test_create_consensus_header(self):
         labs = ['lab1', 'lab2', 'lab3']
         observed = ConsensusFileGenerator.create_consensus_header(labs)
@@ -46,28 +61,27 @@ class ConsensusFileGeneratorTest(TestCase):
         expected = '1_123_A_C_ABC1'
         self.assertEqual(expected, observed)
 
-    def test_create_consensus_line(self):
+    def test_create_consensus_row(self):
         variant_id = 'cfd99f1bea'
         variant = {'id': variant_id, 'chromosome': '1', 'start': 123, 'stop': 124, 'ref': 'A', 'alt': 'C',
                    'gene': 'ABC1', 'consensus_classification': '(Likely) benign', 'type': 'sub'}
-        observed = self.file_generator._create_consensus_line('cfd99f1bea', variant,
-                                                              {'lab1': 'lb', 'lab2': 'b', 'lab3': ''},
-                                                              ['lab1', 'lab2', 'lab3'])
+        observed = self.file_generator._create_consensus_row('cfd99f1bea', variant,
+                                                             {'lab1': 'lb', 'lab2': 'b', 'lab3': ''},
+                                                             ['lab1', 'lab2', 'lab3'])
         expected = 'cfd99f1bea\t1\t123\t124\tA\tC\tABC1\t\t\t\t\t(Likely) benign\tLAB1_cfd99f1bea\tLikely benign\t' \
                    'LAB2_cfd99f1bea\tBenign\t\t\t2\t\t\tcfd99f1bea\n'
-        self.assertEqual(expected, observed)
+        self.assertEqual(expected, '\t'.join(map(str, observed)) + '\n')
 
-    @parameterized.expand([('empty', {}, 'test', '\t'),
-                           ('column', {'column': 'value'}, 'column', '\tvalue')])
-    def test__add_simple_column(self, _, variant, column, expected):
-        line = ''
-        observed = ConsensusFileGenerator._add_simple_column(line, variant, column)
+    @parameterized.expand([('empty', {}, 'test', ''),
+                           ('column', {'column': 'value'}, 'column', 'value')])
+    def test__get_simple_column(self, _, variant, column, expected):
+        observed = ConsensusFileGenerator._get_simple_column(variant, column)
         self.assertEqual(expected, observed)
 
-    @parameterized.expand([('vus', 'VUS', 3, '\t3'),
-                           ('no consensus', 'No consensus', 0, '\t'),
-                           ('benign', '(Likely) benign', 5, '\t5'),
-                           ('1lab', 'Classified by one lab', 1, '\t1')])
+    @parameterized.expand([('vus', 'VUS', 3, '3'),
+                           ('no consensus', 'No consensus', 0, ''),
+                           ('benign', '(Likely) benign', 5, '5'),
+                           ('1lab', 'Classified by one lab', 1, '1')])
     def test__get_match_count_if_consensus(self, _, classification, matches, expected):
         observed = ConsensusFileGenerator._get_match_count_if_consensus(matches, classification)
         self.assertEqual(expected, observed)
@@ -102,7 +116,8 @@ class ConsensusFileGeneratorTest(TestCase):
             data={'consensus': {},
                   'history': {
                       'history': {},
-                      'alternative': {}}},
+                      'alternative': {},
+                      'exports': []}},
             tables={'consensus_table': '', 'comments_table': ''}, labs=[])
         observed = file_generator._get_history_ids_for_variant(variant_id, chromosome, pos, ref, alt, gene,
                                                                variant_type)
@@ -134,3 +149,69 @@ class ConsensusFileGeneratorTest(TestCase):
     def test___get_matching_history(self, _, variant, expected):
         observed = self.file_generator._get_matching_history(variant)
         self.assertEqual(observed, expected)
+
+    def test_generate_consensus_files_incorrect_variant_history(self):
+        variant = {'id': '6a550d807b', 'chromosome': '1', 'start': '160109408', 'ref': 'A', 'alt': 'AC',
+                   'gene': 'ATP1A2', 'type': 'dup', 'transcript': 'NM_000702.2', 'c_dna': 'c.2841-20_2841-19insC',
+                   'consensus_classification': 'Classified by one lab'}
+        consensus = {'6a550d807b': {'consensus': variant, 'lab_classifications': {'lab1': 'b'}},
+                     '00299bb101': {'consensus': dict(variant, id='00299bb101'),
+                                    'lab_classifications': {'lab1': 'b'}}}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_file_name = os.path.join(tmp_dir, 'incorrect_variant_history.tsv')
+            file_generator = ConsensusFileGenerator(
+                data={'consensus': consensus,
+                      'history': {'history': self.file_generator.history,
+                                  'alternative': self.file_generator.alternative_history,
+                                  'exports': self.file_generator.exports}},
+                tables={'consensus_table': os.path.join(tmp_dir, 'consensus'),
+                        'comments_table': os.path.join(tmp_dir, 'comments')},
+                labs=['lab1'], incorrect_variant_history_file=log_file_name)
+            with mock.patch('builtins.open', wraps=open) as opened:
+                file_generator.generate_consensus_files()
+            opened_files = [call.args[0] for call in opened.call_args_list]
+            with open(log_file_name) as log_file:
+                log = log_file.read()
+
+        self.assertEqual(1, opened_files.count(log_file_name))
+        self.assertEqual('1912_f2941cd0ea\t1912_f2941cd0ea is invalid; will be replaced by correct variant 6a550d807b\n'
+                         '1912_f2941cd0ea\t1912_f2941cd0ea is invalid; will be replaced by correct variant 00299bb101\n',
+                         log)
+
+    def _generate_consensus_files(self, tmp_dir, name, workers):
+        variant = {'id': '6a550d807b', 'chromosome': '1', 'start': '160109408', 'ref': 'A', 'alt': 'AC',
+                   'gene': 'ATP1A2', 'type': 'dup', 'transcript': 'NM_000702.2', 'c_dna': 'c.2841-20_2841-19insC',
+                   'consensus_classification': 'Classified by one lab'}
+        consensus = {f'{position:010d}': {'consensus': dict(variant, id=f'{position:010d}', start=str(position)),
+                                          'lab_classifications': {'lab1': 'b', 'lab2': '' if position % 2 else 'lb'}}
+                     for position in range(100, 130)}
+        file_generator = ConsensusFileGenerator(
+            data={'consensus': consensus,
+                  'history': {'history': self.file_generator.history,
+                              'alternative': self.file_generator.alternative_history,
+                              'exports': self.file_generator.exports}},
+            tables={'consensus_table': os.path.join(tmp_dir, f'{name}_consensus'),
+                    'comments_table': os.path.join(tmp_dir, f'{name}_comments')},
+            labs=['lab1', 'lab2'], incorrect_variant_history_file=os.path.join(tmp_dir, f'{name}_incorrect.tsv'),
+            workers=workers)
+        files = list(file_generator.generate_consensus_files()) + [os.path.join(tmp_dir, f'{name}_incorrect.tsv')]
+        contents = []
+        for file_name in files:
+            with open(file_name) as file:
+                contents.append(file.read())
+        return contents, file_generator.hash_cache
+
+    def test_generate_consensus_files_workers(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            expected_files, expected_cache = self._generate_consensus_files(tmp_dir, 'sequential', None)
+            observed_files, observed_cache = self._generate_consensus_files(tmp_dir, 'sharded', 2)
+            # The shards are removed once they are concatenated
+            self.assertEqual(6, len(os.listdir(tmp_dir)))
+        self.assertEqual(expected_files, observed_files)
+        self.assertEqual(list(expected_cache.new_hashes.items()), list(observed_cache.new_hashes.items()))
+        self.assertEqual(list(expected_cache.used_hashes.items()), list(observed_cache.used_hashes.items()))
+
+    def test__get_shards(self):
+        self.assertEqual([['a', 'b'], ['c', 'd'], ['e']], ConsensusFileGenerator._get_shards(list('abcde'), 3))
+        self.assertEqual([['a'], ['b']], ConsensusFileGenerator._get_shards(['a', 'b'], 8))
+        self.assertEqual([], ConsensusFileGenerator._get_shards([], 8))
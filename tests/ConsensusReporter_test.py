@@ -5,7 +5,12 @@ import tempfile
 from datetime import datetime
 from unittest import TestCase
 
+import numpy
+import pandas
+
+from consensus.ConsensusFileGenerator import ConsensusFileGenerator
 from consensus.ConsensusReporter import ConsensusReporter
+from consensus.ConsensusTableGenerator import ConsensusTableGenerator
 
 
 class TestConsensusReporter(TestCase):
@@ -52,6 +57,62 @@ class TestConsensusReporter(TestCase):
         snapshot.close()
         actual.close()
 
+    def test_write_opposites_missing_values(cls):
+        consensus_df = pandas.DataFrame({
+            'chromosome': [1, 2, 3], 'start': [100, 200, 300], 'ref': ['A', 'G', 'C'], 'alt': ['C', 'T', 'G'],
+            'gene': ['ABC1', 'ABC2', 'ABC3'], 'transcript': ['NM_1.1', numpy.nan, 'NM_3.1'],
+            'c_dna': [numpy.nan, 'c.2G>T', 'c.3C>G'],
+            'consensus_classification': ['Opposite classifications', 'Opposite classifications', 'Benign'],
+            'lab1': ['Benign', numpy.nan, 'Benign'], 'lab2': ['Pathogenic', 'Likely benign', numpy.nan],
+            'lab3': [numpy.nan, 'Likely pathogenic', numpy.nan]})
+        reporter = ConsensusReporter(None, ['lab1', 'lab2', 'lab3'], 'nan_public', 'nan_', cls.tmp_dir.name,
+                                     consensus_df=consensus_df)
+        reporter.write_opposites()
+        reporter.report.close()
+        with open(reporter.opposites_file_name) as report:
+            cls.assertEqual('1\t100\tA\tC\tABC1\tNM_1.1\tnan\tBenign\tPathogenic\t\n'
+                            '2\t200\tG\tT\tABC2\tnan\tc.2G>T\t\tLikely benign\tLikely pathogenic\n', report.read())
+
+    def test_create_consensus_df(cls):
+        variant = {'chromosome': '1', 'start': '160109408', 'ref': 'A', 'alt': 'C', 'gene': 'ATP1A2', 'type': 'snp',
+                   'hgvs_g': 'NC_000001.10:g.160109408A>C', 'classification': 'b'}
+        lab_data = {
+            'lab1': [dict(variant, id='LAB1_1_160109408_A_C_ATP1A2', stop='160109408', c_dna='c.1A>C'),
+                     dict(variant, id='LAB1_X_100_A_C_ABC1', chromosome='X', start='100', gene='ABC1')],
+            'lab2': [dict(variant, id='LAB2_1_160109408_A_C_ATP1A2', classification='p'),
+                     dict(variant, id='LAB2_X_100_A_C_ABC1', chromosome='X', start='100', gene='ABC1',
+                          classification='lb')],
+            'lab3': [dict(variant, id='LAB3_2_200_G_T_ABC2', chromosome='2', start='200', ref='G', alt='T',
+                          gene='ABC2', classification='vus')]}
+        labs = list(lab_data)
+        consensus = ConsensusTableGenerator(lab_data).process_variants()
+        file_generator = ConsensusFileGenerator(
+            data={'consensus': consensus, 'history': {'history': {}, 'alternative': {}, 'exports': []}},
+            tables={'consensus_table': cls.tmp_dir.name + 'df_consensus',
+                    'comments_table': cls.tmp_dir.name + 'df_comments'},
+            labs=labs)
+        consensus_tsv = file_generator.generate_consensus_files()[0]
+        expected = ConsensusReporter(consensus_tsv, labs, 'df_public', 'df_', cls.tmp_dir.name).consensus_df
+        observed = ConsensusReporter.from_consensus(consensus, labs, 'df_public', 'df_', cls.tmp_dir.name).consensus_df
+        columns = ConsensusReporter.consensus_columns + labs + ['matches']
+        pandas.testing.assert_frame_equal(expected[columns], observed)
+
+    def _process_consensus(cls, prefix, workers):
+        output = cls.tmp_dir.name
+        shutil.copyfile('test_data{}test_consensus.csv'.format(os.sep), '{}{}consensus.csv'.format(output, prefix))
+        reporter = ConsensusReporter('{}{}consensus.csv'.format(output, prefix), cls.reporter.labs,
+                                     prefix + 'public_consensus', prefix, output, workers=workers)
+        reporter.process_consensus()
+        return [reporter.opposites_file_name, reporter.counts_file_name, reporter.type_file_name,
+                reporter.public_consensus_file_name, reporter.delins_file_name, reporter.log_file_name]
+
+    def test_process_consensus_workers(cls):
+        expected = cls._process_consensus('sequential_', None)
+        observed = cls._process_consensus('parallel_', 4)
+        for expected_file, observed_file in zip(expected, observed):
+            with open(expected_file) as expected_report, open(observed_file) as observed_report:
+                cls.assertEqual(expected_report.read(), observed_report.read())
+
     @classmethod
     def tearDownClass(cls):
         shutil.rmtree(cls.tmp_dir.name)
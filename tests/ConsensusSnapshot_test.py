@@ -0,0 +1,32 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from consensus.ConsensusSnapshot import ConsensusSnapshot
+
+
+class ConsensusSnapshotTest(TestCase):
+    def test_get_digest(self):
+        variant = {'id': 'LAB1_123', 'classification': 'vus'}
+        self.assertEqual(ConsensusSnapshot.get_digest(variant), ConsensusSnapshot.get_digest(dict(variant)))
+        self.assertNotEqual(ConsensusSnapshot.get_digest(variant),
+                            ConsensusSnapshot.get_digest(dict(variant, classification='b')))
+
+    def test_save_and_load(self):
+        snapshot = ConsensusSnapshot(['lab1'], {'lab1': {'LAB1_123': b'digest'}}, {'123': {'consensus': {}}},
+                                     {'123': {'vus': 1}})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'snapshot.pickle')
+            snapshot.save(file_name)
+            loaded = ConsensusSnapshot.load(file_name, ['lab1'])
+            other_labs = ConsensusSnapshot.load(file_name, ['lab1', 'lab2'])
+
+        self.assertEqual(snapshot.lab_digests, loaded.lab_digests)
+        self.assertEqual(snapshot.consensus, loaded.consensus)
+        self.assertEqual(snapshot.all_classifications, loaded.all_classifications)
+        self.assertEqual({'lab1': {}, 'lab2': {}}, other_labs.lab_digests)
+        self.assertEqual({}, other_labs.consensus)
+
+    def test_load_missing(self):
+        snapshot = ConsensusSnapshot.load('does_not_exist.pickle', ['lab1'])
+        self.assertEqual({'lab1': {}}, snapshot.lab_digests)
@@ -1,7 +1,9 @@
 import unittest
 from parameterized import parameterized
 
+from consensus.ConsensusSnapshot import ConsensusSnapshot
 from consensus.ConsensusTableGenerator import ConsensusTableGenerator
+from consensus.TsvRecord import TsvRecord
 
 
 class TestConsensusTableGenerator(unittest.TestCase):
@@ -146,3 +148,65 @@ class TestConsensusTableGenerator(unittest.TestCase):
         self.assertEqual(expected_label, observed_class)
         self.assertEqual(expected_class, ctg.consensus[self.consensus_id]['lab_classifications'][lab3_label])
         self.assertEqual(expected_total, ctg.all_classifications[self.consensus_id][expected_class])
+
+    def test_process_variants_streaming(self):
+        lab_data = {self.lab_labels[lab]: [dict(self.labs[lab], type='sub')] for lab in ['lab_b', 'lab_vus', 'lab_p']}
+        expected = self.ctg(lab_data).process_variants()
+        streamed_data = {lab: iter(variants) for lab, variants in lab_data.items()}
+        observed = self.ctg(streamed_data).process_variants()
+        self.assertEqual(expected, observed)
+        self.assertEqual('Opposite classifications',
+                         observed['11_108098576_C_G_ATM']['consensus']['consensus_classification'])
+
+    def test_process_variants_records(self):
+        lab_data = {self.lab_labels[lab]: [dict(self.labs[lab], type='sub')] for lab in ['lab_b', 'lab_vus']}
+        expected = self.ctg(lab_data).process_variants()
+        columns = {column: position for position, column in enumerate(lab_data['LABB'][0])}
+        record_data = {lab: [TsvRecord(columns, tuple(variant.values())) for variant in variants]
+                       for lab, variants in lab_data.items()}
+        observed = self.ctg(record_data).process_variants()
+        self.assertEqual(expected, observed)
+
+    def _get_incremental_lab_data(self, classification):
+        lab_b = dict(self.labs['lab_b'], type='sub')
+        other_variant = dict(self.labs['lab_b'], type='sub', id='LABB_11_108098577_C_G_ATM', start=108098577)
+        lab_vus = dict(self.labs['lab_vus'], type='sub', classification=classification)
+        return {'LABB': [lab_b, other_variant], 'LABVUS': [lab_vus]}
+
+    def test_process_variants_incrementally_without_snapshot(self):
+        lab_data = self._get_incremental_lab_data('vus')
+        expected = self.ctg(lab_data).process_variants()
+        ctg = self.ctg(lab_data)
+        observed = ctg.process_variants_incrementally(ConsensusSnapshot(list(lab_data)))
+        self.assertEqual(expected, observed)
+        self.assertEqual(list(expected), list(observed))
+        self.assertEqual({'LABB': 2, 'LABVUS': 1}, {lab: len(ctg.lab_digests[lab]) for lab in ctg.lab_digests})
+
+    def test_process_variants_incrementally(self):
+        previous = self.ctg(self._get_incremental_lab_data('vus'))
+        previous.process_variants_incrementally(ConsensusSnapshot(['LABB', 'LABVUS']))
+        snapshot = previous.create_snapshot()
+        # Mark the unchanged variant in the snapshot, so we can see it is not recomputed
+        snapshot.consensus['11_108098577_C_G_ATM']['consensus']['gene'] = 'FROM_SNAPSHOT'
+
+        lab_data = self._get_incremental_lab_data('lb')
+        expected = self.ctg(self._get_incremental_lab_data('lb')).process_variants()
+        observed = self.ctg(lab_data).process_variants_incrementally(snapshot)
+
+        self.assertEqual(list(expected), list(observed))
+        self.assertEqual(expected['11_108098576_C_G_ATM'], observed['11_108098576_C_G_ATM'])
+        self.assertEqual('(Likely) benign',
+                         observed['11_108098576_C_G_ATM']['consensus']['consensus_classification'])
+        self.assertEqual('FROM_SNAPSHOT', observed['11_108098577_C_G_ATM']['consensus']['gene'])
+
+    def test_process_variants_incrementally_removed(self):
+        previous = self.ctg(self._get_incremental_lab_data('vus'))
+        previous.process_variants_incrementally(ConsensusSnapshot(['LABB', 'LABVUS']))
+
+        lab_data = self._get_incremental_lab_data('vus')
+        lab_data['LABVUS'] = []
+        expected = self.ctg(lab_data).process_variants()
+        observed = self.ctg(lab_data).process_variants_incrementally(previous.create_snapshot())
+        self.assertEqual(expected, observed)
+        self.assertEqual('Classified by one lab',
+                         observed['11_108098576_C_G_ATM']['consensus']['consensus_classification'])
@@ -0,0 +1,35 @@
+import os
+from unittest import TestCase
+
+from consensus.DataRetriever import DataRetriever
+
+
+class DataRetrieverTest(TestCase):
+    labs = ['umcg', 'amc', 'radboud_mumc']
+    folder = 'test_data{}input{}'.format(os.sep, os.sep)
+    history = folder + 'vkgl_consensus_history.tsv'
+
+    def _retrieve(self, workers):
+        retriever = DataRetriever(self.labs, 'vkgl_', self.history, self.folder, lab_columns=['id', 'classification'],
+                                  history_columns=['id'], workers=workers)
+        retriever.retrieve_all_data()
+        return retriever
+
+    def test_retrieve_all_data_threads(self):
+        retriever = self._retrieve(None)
+        self.assertEqual(self.labs, list(retriever.all_lab_data))
+        self.assertEqual({'id': '7d01d706c18b70fe934ffa0e314ab4c962e6df4d46744819843952b7a83bbc52',
+                          'classification': 'lb'}, retriever.all_lab_data['umcg'][0])
+        self.assertEqual({'id': '1805_11_108117691_G_A_ATM'}, retriever.history[0])
+
+    def test_retrieve_all_data_processes(self):
+        expected = self._retrieve(None)
+        observed = self._retrieve(2)
+        self.assertEqual(self.labs, list(observed.all_lab_data))
+        self.assertEqual(expected.all_lab_data, observed.all_lab_data)
+        self.assertEqual(expected.history, observed.history)
+
+    def test_determine_number_of_steps(self):
+        files = [self.folder + 'vkgl_umcg.tsv', self.history]
+        expected = os.path.getsize(files[0]) + os.path.getsize(files[1])
+        self.assertEqual(expected, DataRetriever._determine_number_of_steps(files))
@@ -0,0 +1,80 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import mock
+
+from consensus.HashCache import HashCache
+
+
+class HashCacheTest(TestCase):
+    def test_hash(self):
+        cache = HashCache()
+        self.assertEqual('4d11f6c3b0', cache.hash('11_108167858_T_A_ATM'))
+        with mock.patch('consensus.HashCache.Hasher.hash') as hasher:
+            self.assertEqual('4d11f6c3b0', cache.hash('11_108167858_T_A_ATM'))
+            hasher.assert_not_called()
+
+    def test_save_and_reuse(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'hashes.tsv')
+            cache = HashCache(file_name)
+            cache.hash('11_108167858_T_A_ATM')
+            cache.save()
+            cache.save()
+
+            reused = HashCache(file_name)
+            with mock.patch('consensus.HashCache.Hasher.hash') as hasher:
+                self.assertEqual('4d11f6c3b0', reused.hash('11_108167858_T_A_ATM'))
+                hasher.assert_not_called()
+            self.assertEqual({}, reused.new_hashes)
+            with open(file_name) as hash_file:
+                self.assertEqual(['11_108167858_T_A_ATM\t4d11f6c3b0\n'], hash_file.readlines())
+
+    def test_update(self):
+        cache = HashCache()
+        cache.hash('11_108167858_T_A_ATM')
+        cache.update({'11_108167858_T_A_ATM': 'other', 'value': 'hashed'})
+        self.assertEqual('4d11f6c3b0', cache.hash('11_108167858_T_A_ATM'))
+        self.assertEqual({'11_108167858_T_A_ATM': '4d11f6c3b0', 'value': 'hashed'}, cache.new_hashes)
+        self.assertEqual({'11_108167858_T_A_ATM': '4d11f6c3b0', 'value': 'hashed'}, cache.used_hashes)
+
+    def test_save_keeps_used_hashes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'hashes.tsv')
+            cache = HashCache(file_name)
+            cache.hash('11_108167858_T_A_ATM')
+            cache.save()
+            reused = HashCache(file_name)
+            reused.hash('11_108167858_T_A_ATM')
+            reused.hash('1_1_A_C_G')
+            reused.save()
+            with open(file_name) as hash_file:
+                self.assertEqual(['11_108167858_T_A_ATM\t4d11f6c3b0\n', '1_1_A_C_G\t642dc53f29\n'],
+                                 hash_file.readlines())
+            self.assertFalse(os.path.isfile(file_name + '.tmp'))
+
+    def test_save_removes_unused_hashes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'hashes.tsv')
+            cache = HashCache(file_name)
+            cache.hash('11_108167858_T_A_ATM')
+            cache.hash('1_1_A_C_G')
+            cache.save()
+            # The first id is no longer in the consensus
+            reused = HashCache(file_name)
+            reused.hash('1_1_A_C_G')
+            reused.save()
+            self.assertEqual({'1_1_A_C_G': '642dc53f29'}, HashCache(file_name).hashes)
+
+    def test_damaged_file_is_discarded(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'hashes.tsv')
+            with open(file_name, 'w') as hash_file:
+                hash_file.write('11_108167858_T_A_ATM\t4d11f6c3b0\n1_1_A_C_G\t642dc53')
+            cache = HashCache(file_name)
+            self.assertEqual({}, cache.hashes)
+            self.assertEqual('642dc53f29', cache.hash('1_1_A_C_G'))
+            cache.save()
+            # The damaged file is replaced by a valid file
+            self.assertEqual({'1_1_A_C_G': '642dc53f29'}, HashCache(file_name).hashes)
@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+from consensus.HistorySorter import HistorySorter
+
+
+class HistorySorterTest(TestCase):
+    history = [
+        {'id': '1805_11_108117691_G_A_ATM', 'gene': 'ATM', 'transcript': '', 'c_dna': 'c.902G>A'},
+        {'id': '1912_00299bb101', 'gene': 'PALB2', 'transcript': 'NM_024675.3', 'c_dna': 'c.2928G>T'},
+        {'id': '1912_00299bb101_dup0', 'gene': 'PALB2', 'transcript': 'NM_024675.3', 'c_dna': 'c.2928G>T'},
+        {'id': '1912_f2941cd0ea_dup1', 'gene': 'ATP1A2', 'transcript': 'NM_000702.2',
+         'c_dna': 'c.2841-20_2841-19insC'}
+    ]
+
+    def test_history_index(self):
+        sorter = HistorySorter(self.history, ['1805', '1912'])
+        expected = {
+            '11_108117691_G_A_ATM': {'1805': {''}},
+            '00299bb101': {'1912': {'', '_dup0'}},
+            '00299bb101_dup0': {'1912': {''}},
+            'f2941cd0ea': {'1912': {'_dup1'}},
+            'f2941cd0ea_dup1': {'1912': {''}}
+        }
+        self.assertEqual(expected, sorter.history_index)
+
+    def test_alternative_history(self):
+        sorter = HistorySorter(self.history, ['1805', '1912'])
+        expected = {
+            '1805': {'ATM_:c.902G>A': '1805_11_108117691_G_A_ATM'},
+            '1912': {'PALB2_NM_024675.3:c.2928G>T': '1912_00299bb101',
+                     'ATP1A2_NM_000702.2:c.2841-20_2841-19insC': '1912_f2941cd0ea_dup1'}
+        }
+        self.assertEqual(expected, sorter.alternative_history)
+
+    def test_unknown_export(self):
+        with self.assertRaises(KeyError):
+            HistorySorter(self.history, ['1805'])
@@ -0,0 +1,80 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import mock
+
+from consensus.HistoryPartitions import HistoryPartitions
+from consensus.HistorySorter import HistorySorter
+from consensus.HistoryStore import HistoryStore
+from consensus.TsvToListConverter import TsvToListConverter
+from preprocessing.HistoryWriter import HistoryWriter
+
+
+class HistoryStoreTest(TestCase):
+    history_file = os.path.join('test_data', 'input', 'vkgl_consensus_history.tsv')
+    exports = ['1805', '1810', '1906', '1910', '1912', '2003', '2006', '2009', '2102']
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self.tmp_dir.name, 'history_store')
+        self.history = TsvToListConverter.parse(self.history_file, HistorySorter.history_columns)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_get(self):
+        HistoryStore.build(self.history, self.exports, self.folder, self.history_file)
+        store = HistoryStore(self.folder, self.exports)
+        sorter = HistorySorter(self.history, self.exports)
+        for row_id, exports in sorter.history_index.items():
+            self.assertEqual(exports, store.get(row_id))
+        self.assertIsNone(store.get('not_in_history'))
+
+    def test_alternative_history(self):
+        HistoryStore.build(self.history, self.exports, self.folder, self.history_file)
+        store = HistoryStore(self.folder, self.exports)
+        sorter = HistorySorter(self.history, self.exports)
+        for export in self.exports:
+            self.assertEqual(sorter.alternative_history[export], dict(store.alternative_history[export]))
+            self.assertNotIn('ABC1_NM_1.1:c.1A>C', store.alternative_history[export])
+
+    def test_subset_of_exports(self):
+        HistoryStore.build(self.history, self.exports, self.folder, self.history_file)
+        exports = ['1906', '2102']
+        store = HistoryStore(self.folder, exports)
+        sorter = HistorySorter(self.history, self.exports)
+        for row_id, row_exports in sorter.history_index.items():
+            row_exports = {export: suffixes for export, suffixes in row_exports.items() if export in exports}
+            self.assertEqual(row_exports if row_exports else None, store.get(row_id))
+        self.assertEqual(sorter.alternative_history['1906'], dict(store.alternative_history['1906']))
+
+    def test_get_outdated_exports(self):
+        self.assertEqual(self.exports, HistoryStore.get_outdated_exports(self.folder, self.history_file, self.exports))
+        HistoryStore.build(self.history, self.exports, self.folder, self.history_file)
+        self.assertEqual([], HistoryStore.get_outdated_exports(self.folder, self.history_file, self.exports))
+        self.assertEqual(['2103'], HistoryStore.get_outdated_exports(self.folder, self.history_file,
+                                                                     self.exports + ['2103']))
+
+    def test_update_partitions(self):
+        history_folder = os.path.join(self.tmp_dir.name, 'history')
+        HistoryWriter.partition_history(self.history_file, history_folder)
+        store = HistoryStore.update(self.folder, history_folder, self.exports, HistorySorter.history_columns)
+        sorter = HistorySorter(self.history, self.exports)
+        for row_id, exports in sorter.history_index.items():
+            self.assertEqual(exports, store.get(row_id))
+        # Only the partition that changed is read again
+        partition_file = HistoryPartitions.get_partition(history_folder, '2009')
+        with open(partition_file) as partition:
+            row = partition.readlines()[1].split('\t')
+        with open(partition_file, 'a') as partition:
+            partition.write('\t'.join(['"2009_abc"'] + row[1:]))
+        with mock.patch.object(HistoryStore, 'build', wraps=HistoryStore.build) as build:
+            store = HistoryStore.update(self.folder, history_folder, self.exports, HistorySorter.history_columns)
+        self.assertEqual(['2009'], build.call_args.args[1])
+        self.assertEqual(1, build.call_count)
+        self.assertEqual({'2009': {''}}, store.get('abc'))
+
+    def test_unknown_export(self):
+        with self.assertRaises(KeyError):
+            HistoryStore.build(self.history, ['1805'], self.folder, self.history_file)
@@ -0,0 +1,60 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from consensus.TsvToListConverter import TsvToListConverter
+from preprocessing.HistoryWriter import HistoryWriter
+
+
+class HistoryWriterTest(TestCase):
+    consensus_file = os.path.join('test_data', 'input', 'vkgl_consensus202102.tsv')
+    comments_file = os.path.join('test_data', 'input', 'vkgl_consensus_comments202102.tsv')
+
+    def test_write_history(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file = os.path.join(tmp_dir, 'history.tsv')
+            HistoryWriter('2102', self.consensus_file, self.comments_file, history_file)
+            history = TsvToListConverter.parse(history_file)
+        consensus = TsvToListConverter.parse(self.consensus_file, ['id'])
+        self.assertEqual(len(consensus), len(history))
+        self.assertEqual('2102_' + consensus[0]['id'], history[0]['id'])
+        self.assertEqual('February 2021', history[0]['export'])
+        self.assertNotIn('history', history[0])
+        self.assertNotIn('amc_link', history[0])
+
+    def test_append_history(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file = os.path.join(tmp_dir, 'history.tsv')
+            with open(history_file, 'w') as history:
+                # Existing history with other columns in another order and without a newline at the end
+                history.write('"id"\t"export"\t"gene"\t"old"\n"2009_abc"\t"September 2020"\t"ABC1"\t"x"')
+            HistoryWriter('2102', self.consensus_file, self.comments_file, history_file, append=True)
+            history = TsvToListConverter.parse(history_file)
+        self.assertEqual({'id': '2009_abc', 'export': 'September 2020', 'gene': 'ABC1', 'old': 'x'}, history[0])
+        self.assertEqual('February 2021', history[1]['export'])
+        self.assertEqual('', history[1]['old'])
+        self.assertEqual(['id', 'export', 'gene', 'old'], list(history[1]))
+
+    def test_write_partition(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_folder = os.path.join(tmp_dir, 'history')
+            HistoryWriter.partition_history(os.path.join('test_data', 'input', 'vkgl_consensus_history.tsv'),
+                                            history_folder)
+            partitions = sorted(os.listdir(history_folder))
+            HistoryWriter('2103', self.consensus_file, self.comments_file, history_folder)
+            self.assertEqual(sorted(partitions + ['2103.tsv']), sorted(os.listdir(history_folder)))
+            history = TsvToListConverter.parse(os.path.join(history_folder, '2103.tsv'), ['id'])
+            self.assertTrue(all(row['id'].startswith('2103_') for row in history))
+            history = TsvToListConverter.parse(os.path.join(history_folder, '1805.tsv'), ['id'])
+            self.assertTrue(all(row['id'].startswith('1805_') for row in history))
+
+    def test_partition_history_id_column(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history_file = os.path.join(tmp_dir, 'history.tsv')
+            with open(history_file, 'w') as history:
+                history.write('"gene"\t"id"\n"ABC1"\t"2009_abc"\n"ABC2"\t"2102_def"\n')
+            history_folder = os.path.join(tmp_dir, 'history')
+            HistoryWriter.partition_history(history_file, history_folder)
+            self.assertEqual(['2009.tsv', '2102.tsv'], sorted(os.listdir(history_folder)))
+            self.assertEqual([{'gene': 'ABC2', 'id': '2102_def'}],
+                             TsvToListConverter.parse(os.path.join(history_folder, '2102.tsv')))
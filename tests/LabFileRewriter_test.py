@@ -0,0 +1,32 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from consensus.LabFileRewriter import LabFileRewriter
+from consensus.TsvToListConverter import TsvToListConverter
+
+
+class LabFileRewriterTest(TestCase):
+    raw_file = os.path.join('test_data', 'input', 'vkgl_radboud_mumc.tsv')
+
+    def test_get_id(self):
+        self.assertEqual('RADBOUDMUMC_7d01d706c1',
+                         LabFileRewriter.get_id('7d01d706c18b70fe934ffa0e314ab4c962e6df4d46744819843952b7a83bbc52',
+                                                'radboud_mumc'))
+
+    def test_iterate(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            lab_file = os.path.join(tmp_dir, 'vkgl_radboud_mumc.tsv')
+            comments_file = os.path.join(tmp_dir, 'vkgl_comments.tsv')
+            with LabFileRewriter.create_comments_file(comments_file) as comments:
+                rewriter = LabFileRewriter('radboud_mumc', self.raw_file, lab_file, comments)
+                observed = list(rewriter.iterate(['id', 'ref', 'classification']))
+
+            # The rows are the same as the rows of the rewritten lab file
+            self.assertEqual(TsvToListConverter.parse(lab_file, ['id', 'ref', 'classification']), observed)
+            self.assertTrue(observed[0]['id'].startswith('RADBOUDMUMC_'))
+            with open(comments_file) as comments:
+                lines = comments.readlines()
+            self.assertEqual('"id"\t"comments"\n', lines[0])
+            self.assertEqual('"{}"\t"-"\n'.format(observed[0]['id']), lines[1])
+            self.assertEqual(len(observed) + 1, len(lines))
@@ -0,0 +1,249 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+import mock
+
+from consensus.MolgenisSession import MolgenisSession
+from consensus.MolgenisUploader import MolgenisUploader
+from consensus.UploadProgress import UploadProgress
+
+
+class StubMolgenisHandler(BaseHTTPRequestHandler):
+    """
+    Handles the requests to the REST API like MOLGENIS would, and fails the requests the test asks it to fail. A failure
+    is a status, or a tuple with a status and whether the request is applied before the status is returned (like a
+    gateway timeout of a request that the server still finishes). Like a reverse proxy, it rejects long urls.
+    """
+    protocol_version = 'HTTP/1.1'
+    max_url_length = 8192
+
+    def _apply(self, body):
+        server = self.server
+        path = urllib.parse.urlsplit(self.path)
+        if self.command == 'POST' and path.path.startswith('/api/v2/'):
+            table = server.tables.setdefault(path.path[len('/api/v2/'):], [])
+            existing_ids = {entity.get('id', entity.get('ID')) for entity in table}
+            if any(entity.get('id', entity.get('ID')) in existing_ids for entity in body['entities']):
+                return 400, b'{"errors": [{"message": "Duplicate value"}]}'
+            table.extend(body['entities'])
+        elif self.command == 'GET' and path.path.startswith('/api/v2/'):
+            query = urllib.parse.parse_qs(path.query)
+            attribute, values = re.fullmatch(r'(\w+)=in=\((.*)\)', query['q'][0]).groups()
+            ids = json.loads(f'[{values}]')
+            items = [{attribute: entity[attribute]} for entity in server.tables.get(path.path[len('/api/v2/'):], [])
+                     if entity[attribute] in ids]
+            return 200, json.dumps({'items': items}).encode('utf-8')
+        elif self.command == 'DELETE':
+            server.tables.pop(path.path[len('/api/v1/'):], None)
+        elif path.path == '/api/v1/login':
+            return 200, b'{"token": "session-token"}'
+        return 200, b''
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length)) if length else None
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.path, body, self.headers.get('x-molgenis-token')))
+            failure = server.failures.pop(0) if server.failures else 200
+            status, applied = failure if isinstance(failure, tuple) else (failure, failure == 200)
+            if len(self.path) > self.max_url_length:
+                status, applied = 414, False
+            response = b''
+            if applied:
+                applied_status, response = self._apply(body)
+                status = applied_status if status == 200 else status
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    do_GET = _respond
+    do_POST = _respond
+    do_DELETE = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MolgenisUploaderTest(TestCase):
+    labs = ['lab1', 'lab2']
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubMolgenisHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.failures = []
+        self.server.tables = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.session = MolgenisSession(f'http://127.0.0.1:{self.server.server_address[1]}', 'token', pool_size=2,
+                                       retries=2, backoff=0)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = self.tmp_dir.name + os.sep
+        self.tables = {'vkgl_comments': 5, 'vkgl_lab1': 3, 'vkgl_lab2': 2, 'vkgl_consensus_comments': 4,
+                       'vkgl_consensus': 4, 'vkgl_public_consensus': 3}
+        for table, rows in self.tables.items():
+            with open(f'{self.folder}{table}.tsv', 'w') as file:
+                file.write('"id"\t"classification"\n')
+                file.writelines(f'"{table}_{row}"\t{"b" if row % 2 else ""}\n' for row in range(rows))
+
+    def tearDown(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def _create_uploader(self, progress=None, concurrency=2):
+        return MolgenisUploader(self.session, self.folder, 'vkgl_', self.labs,
+                                {'consensus_table': 'vkgl_consensus', 'comments_table': 'vkgl_consensus_comments'},
+                                progress, batch_size=2, concurrency=concurrency)
+
+    def _get_posted_ids(self, table):
+        return [[entity['id'] for entity in body['entities']] for method, path, body, _ in self.server.requests if
+                method == 'POST' and path == f'/api/v2/{table}']
+
+    def _get_ids(self, table):
+        return sorted(entity['id'] for entity in self.server.tables[table])
+
+    def test_get_steps(self):
+        steps = self._create_uploader().get_steps()
+        self.assertEqual([('delete', 'vkgl_consensus'), ('delete', 'vkgl_consensus_comments'), ('delete', 'vkgl_lab1'),
+                          ('delete', 'vkgl_lab2'), ('delete', 'vkgl_comments'), ('import', 'vkgl_comments'),
+                          ('import', 'vkgl_lab1'), ('import', 'vkgl_lab2'), ('import', 'vkgl_consensus_comments'),
+                          ('import', 'vkgl_consensus'), ('delete', 'vkgl_public_consensus'),
+                          ('import', 'vkgl_public_consensus')], steps)
+
+    def test_get_steps_configured_tables(self):
+        steps = MolgenisUploader(self.session, self.folder, 'vkgl_', self.labs,
+                                 {'consensus_table': 'vkgl_cons', 'comments_table': 'vkgl_cons_comments'}).get_steps()
+        self.assertEqual([('delete', 'vkgl_cons'), ('delete', 'vkgl_cons_comments')], steps[0:2])
+        self.assertEqual([('import', 'vkgl_cons_comments'), ('import', 'vkgl_cons')], steps[8:10])
+
+    def test_upload(self):
+        self._create_uploader().upload()
+        for table, rows in self.tables.items():
+            self.assertEqual(sorted(f'{table}_{row}' for row in range(rows)), self._get_ids(table))
+        self.assertIn({'id': 'vkgl_lab1_1', 'classification': 'b'}, self.server.tables['vkgl_lab1'])
+        # Empty values are not sent
+        self.assertIn({'id': 'vkgl_lab1_0'}, self.server.tables['vkgl_lab1'])
+        # The consensus is only imported after the tables it refers to
+        paths = [(method, path) for method, path, _, _ in self.server.requests]
+        self.assertLess(max(paths.index(('POST', f'/api/v2/{table}')) for table in ['vkgl_comments', 'vkgl_lab2']),
+                        paths.index(('POST', '/api/v2/vkgl_consensus')))
+        self.assertEqual({'token'}, {token for _, _, _, token in self.server.requests})
+
+    def test_upload_retry(self):
+        self.server.failures = [200, 503, 504]
+        self._create_uploader().upload()
+        self.assertEqual(['vkgl_comments_0', 'vkgl_comments_1', 'vkgl_comments_2', 'vkgl_comments_3',
+                          'vkgl_comments_4'], self._get_ids('vkgl_comments'))
+        self.assertEqual([('DELETE', '/api/v1/vkgl_consensus'), ('DELETE', '/api/v1/vkgl_consensus_comments'),
+                          ('DELETE', '/api/v1/vkgl_consensus_comments'), ('DELETE', '/api/v1/vkgl_consensus_comments')],
+                         [request[0:2] for request in self.server.requests[0:4]])
+
+    def test_upload_applied_batch_timeout(self):
+        # The first batch of the comments is added, but the gateway times out before MOLGENIS responds
+        self.server.failures = [200] * 5 + [(504, True)]
+        self._create_uploader(concurrency=1).upload()
+        self.assertEqual(sorted(f'vkgl_comments_{row}' for row in range(5)), self._get_ids('vkgl_comments'))
+        # The ids of the batch are looked up and the batch is not sent again
+        self.assertEqual([['vkgl_comments_0', 'vkgl_comments_1'], ['vkgl_comments_2', 'vkgl_comments_3'],
+                          ['vkgl_comments_4']], self._get_posted_ids('vkgl_comments'))
+        self.assertEqual('GET', self.server.requests[6][0])
+
+    def test_upload_applied_batch_timeout_default_batch_size(self):
+        with open(f'{self.folder}vkgl_comments.tsv', 'w') as file:
+            file.write('"id"\t"comments"\n')
+            file.writelines(f'"vkgl_comments_{row}"\t"comment"\n' for row in range(1500))
+        self.server.failures = [200] * 5 + [(504, True)]
+        MolgenisUploader(self.session, self.folder, 'vkgl_', self.labs,
+                         {'consensus_table': 'vkgl_consensus', 'comments_table': 'vkgl_consensus_comments'},
+                         concurrency=1).upload()
+        self.assertEqual(sorted(f'vkgl_comments_{row}' for row in range(1500)), self._get_ids('vkgl_comments'))
+        self.assertEqual([1000, 500], [len(ids) for ids in self._get_posted_ids('vkgl_comments')])
+        # The ids of the batch are looked up in several requests
+        lookups = [request for request in self.server.requests if request[0] == 'GET']
+        self.assertEqual(10, len(lookups))
+
+    def test_upload_failed_batch_timeout(self):
+        # The first batch of the comments is not added and the gateway times out
+        self.server.failures = [200] * 5 + [504]
+        self._create_uploader(concurrency=1).upload()
+        self.assertEqual(sorted(f'vkgl_comments_{row}' for row in range(5)), self._get_ids('vkgl_comments'))
+        # The batch is only sent again after its ids were not found
+        self.assertEqual(['POST', 'GET', 'POST'], [request[0] for request in self.server.requests[5:8]])
+        self.assertEqual([['vkgl_comments_0', 'vkgl_comments_1'], ['vkgl_comments_0', 'vkgl_comments_1'],
+                          ['vkgl_comments_2', 'vkgl_comments_3'], ['vkgl_comments_4']],
+                         self._get_posted_ids('vkgl_comments'))
+
+    def test_upload_error(self):
+        self.server.failures = [400]
+        with self.assertRaises(IOError):
+            self._create_uploader().upload()
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_upload_resume(self):
+        progress_file = f'{self.folder}upload_progress.json'
+        # Fail the second batch of the comments
+        self.server.failures = [200] * 6 + [400]
+        with self.assertRaises(IOError):
+            self._create_uploader(UploadProgress(progress_file), concurrency=1).upload()
+        # The batches before and after the failed batch were uploaded
+        self.assertEqual(['vkgl_comments_0', 'vkgl_comments_1', 'vkgl_comments_4'], self._get_ids('vkgl_comments'))
+
+        self.server.requests = []
+        self._create_uploader(UploadProgress(progress_file), concurrency=1).upload()
+        self.assertEqual(sorted(f'vkgl_comments_{row}' for row in range(5)), self._get_ids('vkgl_comments'))
+        # The tables are not deleted again and only the failed batch is sent again
+        self.assertNotIn(('DELETE', '/api/v1/vkgl_consensus'), [request[0:2] for request in self.server.requests])
+        self.assertEqual([['vkgl_comments_2', 'vkgl_comments_3']], self._get_posted_ids('vkgl_comments'))
+        self.assertFalse(os.path.isfile(progress_file))
+
+    def test_upload_resume_unrecorded_batch(self):
+        progress_file = f'{self.folder}upload_progress.json'
+        add_batch = UploadProgress.add_batch
+
+        def interrupt_first_batch(progress, table, batch):
+            if batch == 0:
+                raise RuntimeError('interrupted')
+            add_batch(progress, table, batch)
+
+        # The first batch of the comments is added, but the upload stops before it is recorded
+        with mock.patch.object(UploadProgress, 'add_batch', autospec=True, side_effect=interrupt_first_batch):
+            with self.assertRaises(RuntimeError):
+                self._create_uploader(UploadProgress(progress_file), concurrency=1).upload()
+        self.assertIn('vkgl_comments_0', self._get_ids('vkgl_comments'))
+
+        self.server.requests = []
+        self._create_uploader(UploadProgress(progress_file), concurrency=1).upload()
+        self.assertEqual(sorted(f'vkgl_comments_{row}' for row in range(5)), self._get_ids('vkgl_comments'))
+        # MOLGENIS rejects the batch because its ids exist, and the batch is found to be added already
+        self.assertEqual(['POST', 'GET'], [request[0] for request in self.server.requests[0:2]])
+        self.assertFalse(os.path.isfile(progress_file))
+
+    def test_upload_resume_changed_file(self):
+        progress_file = f'{self.folder}upload_progress.json'
+        self.server.failures = [200] * 6 + [400]
+        with self.assertRaises(IOError):
+            self._create_uploader(UploadProgress(progress_file), concurrency=1).upload()
+        with open(f'{self.folder}vkgl_comments.tsv', 'a') as file:
+            file.write('"vkgl_comments_5"\t\n')
+
+        self.server.requests = []
+        with self.assertRaisesRegex(IOError, 'vkgl_comments changed'):
+            self._create_uploader(UploadProgress(progress_file), concurrency=1).upload()
+        # Nothing is uploaded, so the rows of the old file are not mixed with the new file
+        self.assertEqual([], self.server.requests)
+        self.assertTrue(os.path.isfile(progress_file))
+
+    def test_login(self):
+        self.session.login('admin', 'secret')
+        self.assertEqual('session-token', self.session.token)
+        self.assertEqual(('POST', '/api/v1/login', {'username': 'admin', 'password': 'secret'}, None),
+                         self.server.requests[0])
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+
+from consensus.ParsedFileCache import ParsedFileCache
+from consensus.TsvToListConverter import TsvToListConverter
+
+
+class ParsedFileCacheTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tsv = os.path.join(self.tmp_dir.name, 'vkgl_lab.tsv')
+        shutil.copyfile(os.path.join('test_data', 'input', 'vkgl_umcg.tsv'), self.tsv)
+        self.cache = ParsedFileCache(os.path.join(self.tmp_dir.name, 'cache'))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _parse(self, columns=None):
+        with mock.patch.object(TsvToListConverter, 'parse', wraps=TsvToListConverter.parse) as parse:
+            records = self.cache.parse(self.tsv, columns)
+        return records, parse.call_count
+
+    def test_parse_cached(self):
+        expected, parsed = self._parse(['id', 'classification'])
+        self.assertEqual(1, parsed)
+        observed, parsed = self._parse(['id', 'classification'])
+        self.assertEqual(0, parsed)
+        self.assertEqual(expected, observed)
+        self.assertEqual(['id', 'classification'], list(observed[0]))
+
+    def test_parse_other_columns(self):
+        self._parse(['id'])
+        observed, parsed = self._parse(['id', 'classification'])
+        self.assertEqual(1, parsed)
+
+    def test_parse_touched(self):
+        self._parse()
+        stat = os.stat(self.tsv)
+        os.utime(self.tsv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        observed, parsed = self._parse()
+        # The content is the same, so the file doesn't need to be parsed again
+        self.assertEqual(0, parsed)
+
+    def test_parse_touched_not_hashed_again(self):
+        expected, parsed = self._parse()
+        stat = os.stat(self.tsv)
+        os.utime(self.tsv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self._parse()
+        with mock.patch.object(ParsedFileCache, '_get_file_hash') as get_file_hash:
+            observed, parsed = self._parse()
+        get_file_hash.assert_not_called()
+        self.assertEqual(0, parsed)
+        self.assertEqual(expected, observed)
+
+    def test_parse_changed(self):
+        self._parse()
+        number_of_columns = len(TsvToListConverter.parse(self.tsv)[0])
+        with open(self.tsv, 'a') as tsv:
+            tsv.write('\n' + '\t'.join(['LAB_1'] + [''] * (number_of_columns - 1)))
+        observed, parsed = self._parse()
+        self.assertEqual(1, parsed)
+        self.assertEqual('LAB_1', observed[-1]['id'])
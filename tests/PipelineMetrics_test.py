@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+import mock
+
+from consensus.DataRetriever import DataRetriever
+from consensus import PipelineMetrics as pipeline_metrics
+from consensus.PipelineMetrics import PipelineMetrics
+
+
+class PipelineMetricsTest(TestCase):
+    def test_stage(self):
+        metrics = PipelineMetrics()
+        with metrics.stage('consensus') as stage:
+            stage['rows'] = 10
+        observed = metrics.stages[0]
+        self.assertEqual('consensus', observed['stage'])
+        self.assertEqual(10, observed['rows'])
+        self.assertGreaterEqual(observed['seconds'], 0)
+        self.assertGreater(observed['process_peak_rss_mb'], 0)
+        self.assertIn('rows_per_second', observed)
+        self.assertIn('allocated_blocks_delta', observed)
+        self.assertFalse(observed['failed'])
+
+    def test_stage_without_rows(self):
+        metrics = PipelineMetrics()
+        with metrics.stage('history'):
+            pass
+        self.assertIsNone(metrics.stages[0]['rows'])
+        self.assertIsNone(metrics.stages[0]['rows_per_second'])
+
+    def test_record_lab_from_threads(self):
+        metrics = PipelineMetrics()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for lab in range(100):
+                executor.submit(metrics.record_lab, f'lab{lab}', 0.5, 10)
+        self.assertEqual(100, len(metrics.labs))
+        self.assertEqual({'lab': 'lab1', 'seconds': 0.5, 'rows': 10, 'rows_per_second': 20.0},
+                         [lab for lab in metrics.labs if lab['lab'] == 'lab1'][0])
+
+    def test_save(self):
+        metrics = PipelineMetrics()
+        with metrics.stage('files') as stage:
+            stage['rows'] = 1
+        metrics.record_lab('umcg', 1, 5)
+        with tempfile.TemporaryDirectory() as folder:
+            file_name = os.path.join(folder, 'metrics.json')
+            metrics.save(file_name)
+            with open(file_name) as metrics_file:
+                observed = json.load(metrics_file)
+        self.assertEqual(metrics.to_dict(), observed)
+
+    def test_retrieval_per_lab(self):
+        metrics = PipelineMetrics()
+        labs = ['umcg', 'amc']
+        retriever = DataRetriever(labs, 'vkgl_', None, 'test_data{}input{}'.format(os.sep, os.sep),
+                                  lab_columns=['id'], metrics=metrics)
+        retriever.retrieve_all_data()
+        self.assertEqual(labs, [lab['lab'] for lab in metrics.labs])
+        self.assertEqual([len(retriever.all_lab_data[lab]) for lab in labs], [lab['rows'] for lab in metrics.labs])
+
+    def test_stage_error(self):
+        metrics = PipelineMetrics()
+        with self.assertRaises(ValueError):
+            with metrics.stage('files'):
+                raise ValueError('error')
+        self.assertEqual('files', metrics.stages[0]['stage'])
+        self.assertTrue(metrics.stages[0]['failed'])
+        self.assertIn('seconds', metrics.stages[0])
+
+    def test_stage_without_resource(self):
+        metrics = PipelineMetrics()
+        with mock.patch.object(pipeline_metrics, 'resource', None):
+            with metrics.stage('files'):
+                pass
+        self.assertIsNone(metrics.stages[0]['process_peak_rss_mb'])
@@ -0,0 +1,32 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from consensus.SortedIndex import SortedIndex
+
+
+class SortedIndexTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.keys_file = os.path.join(self.tmp_dir.name, 'keys.npy')
+        self.values_file = os.path.join(self.tmp_dir.name, 'values.npy')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_lookup(self):
+        SortedIndex.save(self.keys_file, ['b', 'ccc', 'a'], self.values_file, ['2', '3', '1'])
+        index = SortedIndex(self.keys_file, self.values_file)
+        self.assertEqual({'a': '1', 'b': '2', 'ccc': '3'}, dict(index))
+        self.assertEqual('3', index['ccc'])
+        self.assertIn('a', index)
+        # Not in the index, even though it starts with a key that is
+        self.assertNotIn('cccc', index)
+        self.assertNotIn('cc', index)
+        with self.assertRaises(KeyError):
+            index['d']
+
+    def test_missing_file(self):
+        index = SortedIndex(self.keys_file)
+        self.assertEqual(0, len(index))
+        self.assertNotIn('a', index)
@@ -0,0 +1,41 @@
+import pickle
+import unittest
+
+from consensus.TsvRecord import TsvRecord
+
+
+class TestTsvRecord(unittest.TestCase):
+    columns = {'id': 0, 'classification': 1}
+
+    def test_get_item(self):
+        record = TsvRecord(self.columns, ('LAB1_123', 'vus'))
+        self.assertEqual('vus', record['classification'])
+        self.assertEqual('LAB1_123', record.get('id'))
+        self.assertIsNone(record.get('stop'))
+        with self.assertRaises(KeyError):
+            _ = record['stop']
+
+    def test_contains(self):
+        record = TsvRecord(self.columns, ('LAB1_123', 'vus'))
+        self.assertIn('classification', record)
+        self.assertNotIn('stop', record)
+
+    def test_equals_dict(self):
+        record = TsvRecord(self.columns, ('LAB1_123', 'vus'))
+        self.assertEqual({'id': 'LAB1_123', 'classification': 'vus'}, record)
+        self.assertEqual(['id', 'classification'], list(record))
+
+    def test_pickle(self):
+        records = [TsvRecord(self.columns, ('LAB1_123', 'vus')), TsvRecord(self.columns, ('LAB1_456', 'b'))]
+        unpickled = pickle.loads(pickle.dumps(records))
+        self.assertEqual(records, unpickled)
+        # The columns are shared by all records of a file, also after unpickling
+        self.assertIs(unpickled[0]._columns, unpickled[1]._columns)
+
+    def test_no_instance_dict(self):
+        record = TsvRecord(self.columns, ('LAB1_123', 'vus'))
+        self.assertFalse(hasattr(record, '__dict__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,6 +13,15 @@ class TestTsvToListConverter(unittest.TestCase):
             result = TsvToListConverter.parse("filename")
             self.assertEqual(result, [{'col1': 'val1', 'col2': 'val2', 'col3': 'val3'}])
 
+    def test_iterate_selected_columns(self):
+        with mock.patch('consensus.TsvToListConverter.open',
+                        mock.mock_open(read_data='"col1"\t"col2"\t"col3"\n"val1"\t"val2"\t"val3"\n'
+                                                 '"val4"\t"val5"\t"val6"\n'),
+                        create=True) as m:
+            result = TsvToListConverter.iterate("filename", ['col3', 'col1', 'col4'])
+            self.assertEqual(next(result), {'col3': 'val3', 'col1': 'val1'})
+            self.assertEqual(list(result), [{'col3': 'val6', 'col1': 'val4'}])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from consensus.TsvWriter import TsvWriter
+
+
+class TestTsvWriter(unittest.TestCase):
+    def test_write_row(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'test.tsv')
+            with TsvWriter(file_name, buffer_size=2) as writer:
+                writer.write_row(['id', 'start'])
+                self.assertEqual(1, len(writer.buffer))
+                writer.write_row(['a', 1])
+                writer.write_row(['b', ''])
+                # The buffer is written when it is full
+                self.assertEqual(1, len(writer.buffer))
+            with open(file_name) as written:
+                self.assertEqual('id\tstart\na\t1\nb\t\n', written.read())
+
+    def test_append(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'test.tsv')
+            with TsvWriter(file_name) as writer:
+                writer.write_row(['id'])
+            with TsvWriter(file_name, mode='a') as writer:
+                writer.write_row(['a'])
+            with open(file_name) as written:
+                self.assertEqual('id\na\n', written.read())
+
+    def test_append_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, 'test.tsv')
+            part_name = os.path.join(tmp_dir, 'part.tsv')
+            with open(part_name, 'w') as part:
+                part.write('b\n')
+            with TsvWriter(file_name) as writer:
+                writer.write_row(['a'])
+                writer.append_file(part_name)
+                writer.write_row(['c'])
+            with open(file_name) as written:
+                self.assertEqual('a\nb\nc\n', written.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import pandas
 from parameterized import parameterized
 from nose.tools import assert_equal
 
@@ -34,4 +35,40 @@ def test_simplify_ref_alt(raw_ref, raw_alt, expected_ref, expected_alt):
 )
 def test_get_variant_type(ref, alt, expected_type):
     type = Variants.get_variant_type(ref, alt)
-    assert_equal(expected_type, type)
\ No newline at end of file
+    assert_equal(expected_type, type)
+
+def test_get_variant_types():
+    refs = pandas.Series(['G', 'GGGC', 'G', 'GAG', 'G', 'GGAGG', 'GAG'], index=[3, 4, 5, 6, 7, 8, 9])
+    alts = pandas.Series(['C', 'GGAA', 'GAG', 'G', 'C', 'GGCGG', 'G'], index=[3, 4, 5, 6, 7, 8, 9])
+    types = Variants.get_variant_types(refs, alts)
+    assert_equal(['snp', 'delins', 'ins', 'del', 'snp', 'snp', 'del'], types.tolist())
+    assert_equal(refs.index.tolist(), types.index.tolist())
+
+
+def test_need_simplifications():
+    refs = pandas.Series(['G', 'GGGC', '', 'GAG'])
+    alts = pandas.Series(['C', 'GGAA', 'G', 'G'])
+    observed = Variants.need_simplifications(refs, alts)
+    expected = [Variants.need_simplification(ref, alt) for ref, alt in zip(refs, alts)]
+    assert_equal(expected, observed.tolist())
+
+
+def test_simplify_ref_alts():
+    refs = pandas.Series(['G', 'GGGC', 'GGGC', 'G', 'GAG', 'GGAGG'])
+    alts = pandas.Series(['C', 'GGAA', 'GAA', 'GAG', 'G', 'GGCGG'])
+    observed_refs, observed_alts = Variants.simplify_ref_alts(refs, alts)
+    assert_equal(['G', 'GC', 'GGC', '.', 'AG', 'A'], observed_refs.tolist())
+    assert_equal(['C', 'AA', 'AA', 'AG', '.', 'C'], observed_alts.tolist())
+
+
+def test_get_cache_info():
+    Variants.clear_caches()
+    Variants.get_variant_type('GAG', 'G')
+    Variants.get_variant_type('GAG', 'G')
+    info = Variants.get_cache_info()
+    assert_equal(1, info['get_variant_type'].hits)
+    assert_equal(1, info['get_variant_type'].misses)
+    # The simplification is only done when the type was not cached
+    assert_equal(1, info['simplify_ref_alt'].misses)
+    Variants.clear_caches()
+    assert_equal(0, Variants.get_cache_info()['get_variant_type'].currsize)
@@ -15,7 +15,7 @@ class TestIT(unittest.TestCase):
                                    'vkgl_comments.tsv', 'vkgl_consensus.tsv',
                                    'vkgl_consensus_comments.tsv', 'vkgl_counts.html',
                                    'vkgl_delins.tsv',
-                                   'vkgl_erasmus.tsv', 'vkgl_log.tsv', 'vkgl_lumc.tsv',
+                                   'vkgl_erasmus.tsv', 'vkgl_log.tsv', 'vkgl_lumc.tsv', 'pipeline_metrics.json',
                                    'vkgl_nki.tsv',
                                    'vkgl_opposites_report_' + datetime.now().strftime(
                                        "%y%m") + '.tsv', 'vkgl_public_consensus.tsv',